@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of the download copy loop: the original 16KB read/write loop with a progress bar update per
+chunk against `hydra.helpers.download.copy_stream`.  The source is a local file read through an unbuffered raw
+handle, so the numbers reflect the Python side of the loop rather than the network.
+
+    python benchmarks/copy_loop.py --size 1024 --runs 3
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from tqdm import tqdm
+
+from hydra.helpers.download import ThrottledProgress, copy_stream, preallocate
+
+
+def legacy_copy(source_stream, destination_stream, progressbar, chunk_size=16 * 1024):
+    while 1:
+        buf = source_stream.read(chunk_size)
+        if not buf:
+            break
+        destination_stream.write(buf)
+        progressbar.update(len(buf))
+
+
+def current_copy(source_stream, destination_stream, progressbar):
+    preallocate(destination_stream, os.fstat(source_stream.fileno()).st_size)
+    progress = ThrottledProgress(progressbar.update)
+    copy_stream(source_stream, destination_stream, progress)
+    progress.flush()
+
+
+def measure(copy, source_path, destination_path, size):
+    with open(os.devnull, 'w') as devnull, \
+            tqdm(total=size, unit='B', unit_scale=True, miniters=1, file=devnull) as progressbar, \
+            open(source_path, 'rb', buffering=0) as source_stream, \
+            open(destination_path, 'wb') as destination_stream:
+        started = time.perf_counter()
+        copy(source_stream, destination_stream, progressbar)
+        destination_stream.flush()
+        elapsed = time.perf_counter() - started
+    return size / elapsed / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=512, help='payload size in MB')
+    parser.add_argument('--runs', type=int, default=3, help='runs per implementation, the best is reported')
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, 'source')
+        with open(source_path, 'wb') as source_file:
+            for _ in range(args.size):
+                source_file.write(os.urandom(1024 * 1024))
+
+        for name, copy in (('legacy', legacy_copy), ('copy_stream', current_copy)):
+            results = [measure(copy, source_path, os.path.join(directory, name), size) for _ in range(args.runs)]
+            print(f'{name:>12}: {max(results):8.1f} MB/s')
+            os.remove(os.path.join(directory, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Benchmark of the jumpstart pipeline.  A synthetic node directory shaped like a LevelDB-backed node (2MB table
+files spread over the node databases, plus MANIFEST/CURRENT/LOG and genesis files) is archived with each codec and
+served from a local HTTP server, then each stage is timed:
+
+    download      DownloadHelper.fetch of the archive, MB/s of archive bytes
+    decompress    the codec's decompression of the archive, MB/s of tar bytes
+    extract       extraction of the uncompressed tar, MB/s of tar bytes
+    jumpstart     ClientHelper.jumpstart end to end, MB/s of tar bytes
+
+The best of `--runs` runs is reported as JSON.  With `--baseline` (the JSON of an earlier run) the benchmark exits
+with status 1 if any stage is more than `--tolerance` slower than it was.
+
+    python benchmarks/jumpstart.py --size 512 --codec gzip --codec pgzip --output results.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr
+
+from hydra.core.version import get_version
+from hydra.helpers import archive as archive_module
+from hydra.helpers.archive import get_codec
+from hydra.helpers.cache import file_sha256
+from hydra.helpers.peer import JumpstartRequestHandler, ThreadingHTTPServer
+from hydra.main import HydraTest
+
+NETWORK = 'bench'
+TABLE_SIZE = 2 * 1024 * 1024
+PGZIP_BLOCK_SIZE = 64 * 1024 * 1024
+
+# Share of the node data held by each database, roughly as on a long running node
+DATABASES = {
+    'app.db': 0.25,
+    'evm.db': 0.1,
+    'receipts_db': 0.1,
+    'chaindata/data/blockstore.db': 0.3,
+    'chaindata/data/state.db': 0.15,
+    'chaindata/data/tx_index.db': 0.1,
+}
+
+
+def table_data(size, compressibility):
+    # Table files are block compressed already; only part of each one compresses further
+    random_bytes = int(size * (1 - compressibility))
+    return os.urandom(random_bytes) + bytes(range(256)) * ((size - random_bytes) // 256 + 1)
+
+
+def make_node_tree(directory, size, compressibility):
+    """Write a node directory of about `size` bytes of LevelDB table files"""
+    for database, share in DATABASES.items():
+        path = os.path.join(directory, database)
+        os.makedirs(path)
+        remaining, number = int(size * share), 1
+        while remaining > 0:
+            table_size = min(TABLE_SIZE, remaining)
+            with open(os.path.join(path, f'{number:06d}.ldb'), 'wb') as table_file:
+                table_file.write(table_data(table_size, compressibility)[:table_size])
+            remaining -= table_size
+            number += 1
+        for file_name, data in (('CURRENT', b'MANIFEST-000001\n'), ('MANIFEST-000001', os.urandom(64 * 1024)),
+                                ('LOG', b'compaction\n' * 1000)):
+            with open(os.path.join(path, file_name), 'wb') as meta_file:
+                meta_file.write(data)
+
+    for genesis in ('genesis.json', 'chaindata/config/genesis.json'):
+        os.makedirs(os.path.join(directory, os.path.dirname(genesis)), exist_ok=True)
+        with open(os.path.join(directory, genesis), 'w') as genesis_file:
+            json.dump({'chain_id': NETWORK}, genesis_file)
+
+
+def make_tar(source, paths, tar_path):
+    with tarfile.open(tar_path, 'w') as tar:
+        for path in paths:
+            tar.add(os.path.join(source, path), arcname=path)
+    return os.path.getsize(tar_path)
+
+
+def compress(codec, tar_path, archive_path):
+    """Compress a tar the way generate-jumpstart does and return the archive's jumps.json metadata"""
+    archive = {'codec': codec}
+    with open(tar_path, 'rb') as tar_file, open(archive_path, 'wb') as archive_file:
+        if codec == 'gzip':
+            with gzip.GzipFile(fileobj=archive_file, mode='wb', compresslevel=6) as stream:
+                shutil.copyfileobj(tar_file, stream, 1024 * 1024)
+        elif codec == 'pgzip':
+            archive['members'] = []
+            for block in iter(lambda: tar_file.read(PGZIP_BLOCK_SIZE), b''):
+                member = gzip.compress(block, compresslevel=6)
+                archive_file.write(member)
+                archive['members'].append(len(member))
+        elif codec == 'zstd':
+            archive_module.zstandard.ZstdCompressor(level=3, threads=-1).copy_stream(tar_file, archive_file)
+        elif codec == 'lz4':
+            with archive_module.lz4.frame.LZ4FrameFile(archive_file, mode='wb') as stream:
+                shutil.copyfileobj(tar_file, stream, 1024 * 1024)
+
+    archive['size'] = os.path.getsize(archive_path)
+    archive['sha256'] = file_sha256(archive_path)
+    return archive
+
+
+def codec_available(codec):
+    return {'zstd': archive_module.zstandard, 'lz4': archive_module.lz4}.get(codec, True) is not None
+
+
+def publish(codec, source, served, split):
+    """Archive the node tree in `source` into `served`; returns the jumps.json document and the tar paths"""
+    suffix = '.tar.zst' if codec == 'zstd' else '.tar.lz4' if codec == 'lz4' else '.tar.gz'
+    config = ['genesis.json', 'chaindata/config/genesis.json']
+    groups = ([(os.path.basename(database), [database]) for database in DATABASES] + [('config', config)]
+              if split else [('all', list(DATABASES) + config)])
+
+    parts, tars = [], []
+    for part_name, paths in groups:
+        tar_path = os.path.join(served, f'{part_name}.tar')
+        make_tar(source, paths, tar_path)
+        part = compress(codec, tar_path, os.path.join(served, f'{part_name}{suffix}'))
+        part.update(file=f'{part_name}{suffix}', paths=paths)
+        parts.append(part)
+        tars.append(tar_path)
+
+    file_name = f'jumpstart{suffix}'
+    if split:
+        archive = {'codec': codec, 'parts': parts, 'size': sum(part['size'] for part in parts)}
+    else:
+        archive = parts[0]
+        os.rename(os.path.join(served, archive['file']), os.path.join(served, file_name))
+        archive['file'] = file_name
+    return {'1': file_name, 'latest': file_name, 'archives': {file_name: archive}}, tars
+
+
+def serve(files):
+    handler = type('BenchmarkHandler', (JumpstartRequestHandler,), {'files': files})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def timed(stage, num_bytes):
+    started = time.perf_counter()
+    stage()
+    seconds = time.perf_counter() - started
+    return {'seconds': round(seconds, 4), 'bytes': num_bytes, 'mb_per_s': round(num_bytes / seconds / 1024 / 1024, 1)}
+
+
+def best(results):
+    return max(results, key=lambda result: result['mb_per_s'])
+
+
+def benchmark_codec(codec, source, workdir, split, runs):
+    served = os.path.join(workdir, 'served')
+    os.makedirs(served)
+    jumps_json, tars = publish(codec, source, served, split)
+    with open(os.path.join(served, 'jumps.json'), 'w') as jumps_file:
+        json.dump(jumps_json, jumps_file)
+
+    archive = jumps_json['archives'][jumps_json['latest']]
+    archives = archive.get('parts', [archive])
+    tar_bytes = sum(os.path.getsize(tar) for tar in tars)
+    archive_bytes = sum(part['size'] for part in archives)
+
+    server, base_url = serve({f'/jumpstart/{NETWORK}/{name}': os.path.join(served, name)
+                              for name in os.listdir(served)})
+    app = HydraTest()
+    app.setup()
+    app.log.set_level('WARNING')
+    app.config.set('hydra', 'channel_url', base_url)
+    app.config.set('cache', 'path', os.path.join(workdir, 'cache'))
+
+    def download():
+        for part in archives:
+            destination = os.path.join(workdir, 'downloaded')
+            app.download.fetch(destination, f'{base_url}/jumpstart/{NETWORK}/{part["file"]}', show_progress=False,
+                               sha256=part['sha256'], size=part['size'])
+            os.remove(destination)
+
+    def decompress():
+        for part in archives:
+            with open(os.path.join(served, part['file']), 'rb') as archive_file, \
+                    get_codec(part).open(archive_file) as stream:
+                while stream.read(1024 * 1024):
+                    pass
+
+    def extract():
+        destination = os.path.join(workdir, 'extracted')
+        for tar in tars:
+            with tarfile.open(tar, 'r|') as tar_stream:
+                tar_stream.extractall(destination)
+        shutil.rmtree(destination)
+
+    def jumpstart():
+        node = os.path.join(workdir, 'node')
+        os.makedirs(node)
+        cwd = os.getcwd()
+        try:
+            app.client.jumpstart(NETWORK, node, 'latest')
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(node)
+
+    # Progress bars are written to /dev/null, so the terminal isn't measured
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stderr(devnull):
+            stages = {
+                'download': best([timed(download, archive_bytes) for _ in range(runs)]),
+                'decompress': best([timed(decompress, tar_bytes) for _ in range(runs)]),
+                'extract': best([timed(extract, tar_bytes) for _ in range(runs)]),
+                'jumpstart': best([timed(jumpstart, tar_bytes) for _ in range(runs)]),
+            }
+    finally:
+        app.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(served)
+
+    return {'tar_bytes': tar_bytes, 'archive_bytes': archive_bytes,
+            'ratio': round(tar_bytes / archive_bytes, 2), 'stages': stages}
+
+
+def regressions(results, baseline, tolerance):
+    """Stages of `results` more than `tolerance` slower than in `baseline`"""
+    found = []
+    for codec, codec_results in results['results'].items():
+        for stage, result in codec_results['stages'].items():
+            previous = baseline.get('results', {}).get(codec, {}).get('stages', {}).get(stage)
+            if previous and result['mb_per_s'] < previous['mb_per_s'] * (1 - tolerance):
+                found.append(f'{codec} {stage}: {result["mb_per_s"]} MB/s, was {previous["mb_per_s"]} MB/s')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=256, help='node data size in MB')
+    parser.add_argument('--codec', action='append', choices=list(archive_module.CODECS),
+                        help='codec to benchmark, may be repeated (default: gzip)')
+    parser.add_argument('--compressibility', type=float, default=0.3,
+                        help='fraction of each table file that compresses well')
+    parser.add_argument('--split', action='store_true', help='publish one archive per database')
+    parser.add_argument('--runs', type=int, default=3, help='runs per stage, the best is reported')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = {
+        'hydra_version': get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size_bytes': args.size * 1024 * 1024,
+        'compressibility': args.compressibility,
+        'split': args.split,
+        'runs': args.runs,
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source')
+        make_node_tree(source, args.size * 1024 * 1024, args.compressibility)
+
+        for codec in args.codec or ['gzip']:
+            if not codec_available(codec):
+                print(f'Skipping {codec}, its module is not installed', file=sys.stderr)
+                continue
+            workdir = os.path.join(directory, codec)
+            os.makedirs(workdir)
+            results['results'][codec] = benchmark_codec(codec, source, workdir, args.split, args.runs)
+            shutil.rmtree(workdir)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            found = regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in found:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import glob
 import json
 import os
 from collections import OrderedDict
@@ -11,6 +10,7 @@ from cement.utils.version import get_version_banner
 
 from ..core.version import get_version
 from ..helpers import HYDRA
+from ..helpers.cache import file_sha256
 
 VERSION_BANNER = f"""
 Hydra manages many heads of networks {get_version()}
@@ -112,9 +112,24 @@ class Base(Controller):  # pylint: disable=too-many-ancestors
         manifest = {
             'version': build,
             'released': datetime.utcnow().strftime('%c'),
-            'files': ['./shipchain', './tgoracle', './loomcoin_tgoracle', './manifest.json']
+            'files': ['./shipchain', './tgoracle', './loomcoin_tgoracle', './manifest.json'],
+            'checksums': {}
         }
 
+        # Size and sha256 of every distributed file, verified by clients as they download
+        for dist_file in manifest['files']:
+            dist_path = self.release.path(dist_file)
+            if dist_file != './manifest.json' and os.path.isfile(dist_path):
+                manifest['checksums'][dist_file] = {
+                    'size': os.path.getsize(dist_path),
+                    'sha256': file_sha256(dist_path),
+                }
+
+        # Clients upgrading from one of the previous releases only download a patch
+        patches = self.release.make_patches(build)
+        if patches:
+            manifest['patches'] = {'./shipchain': patches}
+
         self.app.log.debug('writing manifest.json')
         manifest_file = self.release.path('manifest.json')
         json.dump(manifest, open(manifest_file, 'w+'), indent=2)
@@ -140,14 +155,29 @@ class Base(Controller):  # pylint: disable=too-many-ancestors
         except s3.meta.client.exceptions.BucketAlreadyOwnedByYou:
             self.app.log.debug(f'Already exists: {bucket}')
 
-        dist = self.release.path() + '/'
+        dist = self.release.path()
 
-        for dist_file in glob.glob(dist + '*'):
-            local_fn = dist_file.replace(dist, '')
-            for version in [f'archive/{dist_version}', 'latest']:
-                s3_key = f'{version}/{local_fn}'
-                self.app.log.debug(f'Uploading: dist/{local_fn} to {s3_key}')
-                s3.Bucket(bucket).upload_file(Filename=dist_file, Key=s3_key, ExtraArgs={'ACL': 'public-read'})
+        for root, _, file_names in os.walk(dist):
+            for file_name in file_names:
+                dist_file = os.path.join(root, file_name)
+                local_fn = os.path.relpath(dist_file, dist)
+                for version in [f'archive/{dist_version}', 'latest']:
+                    s3_key = f'{version}/{local_fn}'
+                    self.app.log.debug(f'Uploading: dist/{local_fn} to {s3_key}')
+                    s3.Bucket(bucket).upload_file(Filename=dist_file, Key=s3_key, ExtraArgs={'ACL': 'public-read'})
+
+        # make-dist builds binary patches from the releases listed here
+        try:
+            history = json.loads(s3.Object(bucket, 'releases.json').get()['Body'].read().decode('utf-8'))
+        except s3.meta.client.exceptions.NoSuchKey:
+            history = {'releases': []}
+        if dist_version not in history['releases']:
+            history['releases'].append(dist_version)
+        s3.Object(bucket, 'releases.json').put(
+            ACL='public-read',
+            Body=json.dumps(history).encode('utf-8'),
+            ContentType='application/json',
+        )
 
         self.app.log.info('Done!')
         self.app.log.info('Release is available at:')
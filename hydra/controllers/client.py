@@ -15,8 +15,48 @@ from cement import Controller, ex
 from cement.utils.shell import Prompt
 
 from hydra.core.exc import HydraError
+from hydra.helpers.client import ClientHelper
 import hydra.main
 
+RATE_LIMIT_ARGS = [
+    (
+        ['--rate-limit'],
+        {
+            'help': 'cap download bandwidth in bytes/sec, e.g. 20M',
+            'action': 'store',
+            'dest': 'rate_limit'
+        }
+    ),
+    (
+        ['--adaptive-rate'],
+        {
+            'help': 'lower the download rate further while the local node falls behind',
+            'action': 'store_true',
+            'dest': 'adaptive_rate'
+        }
+    ),
+]
+
+JUMPSTART_COMPONENT_ARGS = [
+    (
+        ['--jumpstart-role'],
+        {
+            'help': 'only restore the databases a node of this role needs',
+            'action': 'store',
+            'dest': 'jumpstart_role',
+            'choices': list(ClientHelper.JUMPSTART_ROLES),
+        }
+    ),
+    (
+        ['--jumpstart-components'],
+        {
+            'help': 'comma separated databases to restore in addition to the role\'s, e.g. receipts_db,tx_index.db',
+            'action': 'store',
+            'dest': 'jumpstart_components'
+        }
+    ),
+]
+
 
 class Client(Controller):  # pylint: disable=too-many-ancestors
     class Meta:
@@ -31,6 +71,16 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
         self.app.log.debug('Running: ./shipchain ' + ' '.join(args))
         return self.app.client.exec(*args)
 
+    def _jumpstart_components(self):
+        return self.app.client.jumpstart_components(self.app.pargs.jumpstart_role,
+                                                    self.app.pargs.jumpstart_components)
+
+    def _configure_rate_limit(self):
+        if self.app.pargs.rate_limit:
+            self.app.config.set('download', 'rate_limit', self.app.pargs.rate_limit)
+        if self.app.pargs.adaptive_rate:
+            self.app.config.set('download', 'adaptive_rate', True)
+
     @ex()
     def update(self):
         self.app.client.pip_update_hydra()
@@ -102,6 +152,30 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
                     'default': 'latest'
                 }
             ),
+            (
+                ['--stream-jumpstart'],
+                {
+                    'help': 'extract the jumpstart while it downloads instead of saving it first',
+                    'action': 'store_true',
+                    'dest': 'stream_jumpstart'
+                }
+            ),
+            (
+                ['--keep-jumpstart'],
+                {
+                    'help': 'keep a copy of the downloaded jumpstart archive in the node directory',
+                    'action': 'store_true',
+                    'dest': 'keep_jumpstart'
+                }
+            ),
+            (
+                ['--share-jumpstart'],
+                {
+                    'help': 'keep the verified jumpstart archive for serve-jumpstart to share with other validators',
+                    'action': 'store_true',
+                    'dest': 'share_jumpstart'
+                }
+            ),
             (
                 ['--set-default'],
                 {
@@ -135,9 +209,11 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
                     'dest': 'oracle'
                 }
             ),
-        ]
+        ] + RATE_LIMIT_ARGS + JUMPSTART_COMPONENT_ARGS
     )
     def join_network(self):
+        self._configure_rate_limit()
+        components = self._jumpstart_components()
         name = self.app.utils.env_or_arg('name', 'HYDRA_NETWORK', or_path='.hydra_network', required=True)
         destination = self.app.pargs.destination or self.app.utils.path(name)
 
@@ -152,13 +228,13 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
             rmtree(destination)
 
         if not self.app.pargs.version:
-            url = f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/hydra.json'
+            path = f'networks/{name}/hydra.json'
             try:
-                remote_config = json.loads(requests.get(url).content)
+                remote_config = json.loads(self.app.mirrors.get_metadata(path))
                 version = remote_config['version']
             except json.JSONDecodeError:
                 self.app.log.warning(
-                    f'Error getting network version details from {url}, using "latest"')
+                    f'Error getting network version details from {path}, using "latest"')
                 version = "latest"
         else:
             version = self.app.pargs.version
@@ -166,7 +242,11 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
         self.app.client.bootstrap(destination, version=version, destroy=self.app.pargs.destroy, oracle=self.app.pargs.oracle)
 
         if self.app.pargs.jumpstart != 'none':
-            self.app.client.jumpstart(name, destination, self.app.pargs.jumpstart)
+            self.app.client.jumpstart(name, destination, self.app.pargs.jumpstart,
+                                      stream=self.app.pargs.stream_jumpstart,
+                                      keep_archive=self.app.pargs.keep_jumpstart,
+                                      share=self.app.pargs.share_jumpstart,
+                                      components=components)
 
         if self.app.pargs.do_configure:
             self.app.client.configure(name, destination, version=version, oracle=self.app.pargs.oracle)
@@ -269,6 +349,30 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
                     'default': 'latest'
                 }
             ),
+            (
+                ['--stream-jumpstart'],
+                {
+                    'help': 'extract the jumpstart while it downloads instead of saving it first',
+                    'action': 'store_true',
+                    'dest': 'stream_jumpstart'
+                }
+            ),
+            (
+                ['--keep-jumpstart'],
+                {
+                    'help': 'keep a copy of the downloaded jumpstart archive in the node directory',
+                    'action': 'store_true',
+                    'dest': 'keep_jumpstart'
+                }
+            ),
+            (
+                ['--share-jumpstart'],
+                {
+                    'help': 'keep the verified jumpstart archive for serve-jumpstart to share with other validators',
+                    'action': 'store_true',
+                    'dest': 'share_jumpstart'
+                }
+            ),
             (
                 ['-d', '--destination'],
                 {
@@ -277,20 +381,61 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
                     'dest': 'destination'
                 }
             ),
-        ]
+        ] + RATE_LIMIT_ARGS + JUMPSTART_COMPONENT_ARGS
     )
     def apply_jumpstart(self):
+        self._configure_rate_limit()
+        components = self._jumpstart_components()
         name = self.app.utils.env_or_arg('name', 'HYDRA_NETWORK', or_path='.hydra_network', required=True)
         destination = self.app.pargs.destination or self.app.utils.path(name)
 
         # Stop the service before applying jumpstart files
         self.app.client.stop_service(name, destination)
 
-        self.app.client.jumpstart(name, destination, self.app.pargs.jumpstart)
+        self.app.client.jumpstart(name, destination, self.app.pargs.jumpstart,
+                                  stream=self.app.pargs.stream_jumpstart,
+                                  keep_archive=self.app.pargs.keep_jumpstart,
+                                  share=self.app.pargs.share_jumpstart,
+                                  components=components)
 
         # Restart service now that we're at a higher state
         self.app.client.start_service(name)
 
+    @ex(
+        arguments=[
+            (
+                ['-n', '--name'],
+                {
+                    'help': 'name of network to serve jumpstarts for',
+                    'action': 'store',
+                    'dest': 'name'
+                }
+            ),
+            (
+                ['--bind'],
+                {
+                    'help': 'address to listen on',
+                    'action': 'store',
+                    'dest': 'bind',
+                    'default': '0.0.0.0'
+                }
+            ),
+            (
+                ['-p', '--port'],
+                {
+                    'help': 'port to listen on',
+                    'action': 'store',
+                    'dest': 'port',
+                    'type': int
+                }
+            ),
+        ]
+    )
+    def serve_jumpstart(self):
+        name = self.app.utils.env_or_arg('name', 'HYDRA_NETWORK', or_path='.hydra_network', required=True)
+        port = self.app.pargs.port or int(self.app.config.get('client', 'jumpstart_port'))
+        self.app.client.serve_jumpstart(name, self.app.pargs.bind, port)
+
     @ex(
         arguments=[
             (
@@ -711,7 +856,7 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
         def get(stub):
             url = f'http://{host}:{port}{stub}'
             try:
-                return json.loads(requests.get(url).content)
+                return json.loads(self.app.http.get(url).content)
             except requests.exceptions.ConnectionError:
                 raise HydraError(f'Error accessing {url}.  Is your node running?')
 
@@ -739,7 +884,7 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
         if status['sync_info']['catching_up']:
             outputs['is_caught_up'] = False
 
-            height_response = requests.post(f'https://{name}.network.shipchain.io:46658/query', json={
+            height_response = self.app.http.post(f'https://{name}.network.shipchain.io:46658/query', json={
                 "jsonrpc": "2.0",
                 "id": 1,
                 "method": "getblockheight",
@@ -917,9 +1062,10 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
                     'dest': 'confirmed'
                 }
             ),
-        ]
+        ] + RATE_LIMIT_ARGS
     )
     def upgrade_binary(self):
+        self._configure_rate_limit()
         version = self.app.pargs.version
         confirmed = self.app.pargs.confirmed
 
@@ -935,7 +1081,8 @@ class Client(Controller):  # pylint: disable=too-many-ancestors
 
         os.chdir(destination)
 
-        self.app.utils.download_release_file('./shipchain-temp', 'shipchain', version)
+        # Applies a binary patch to the installed binary when the release publishes one for its version
+        self.app.utils.download_release_file('./shipchain-temp', 'shipchain', version, installed='./shipchain')
 
         os.chmod('./shipchain-temp', os.stat('./shipchain-temp').st_mode | stat.S_IEXEC)
 
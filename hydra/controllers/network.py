@@ -1,15 +1,21 @@
 import json
 import os
 import random
+import tempfile
 import time
 import uuid
 from datetime import datetime
 
-import requests
 from cement import Controller, ex, shell
 from troposphere import Template
 
 from hydra.core.exc import HydraError
+from hydra.helpers.archive import (CODECS, DELTA_DELETED_LIST, diff_file_listing, jumpstart_chain, jumpstart_component,
+                                   parse_file_listing)
+from hydra.helpers.upload import StreamDigest
+
+# Node data is snapshotted here so the node can run while the jumpstart is packaged
+JUMPSTART_SNAPSHOT = '.jumpstart-snapshot'
 
 NAME_ARG = (
     ['--name'],
@@ -156,24 +162,18 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
 
         self.app.network.register(name, registry)
 
-        self.app.log.info('Creation complete, pausing for a minute while the software installs...')
-
-        bootstrapped_a_node = False
-        for ip in registry['ips']:
-            for attempt in range(1, 11):
-                try:
-                    self.app.log.info(f'Bootstrapping node {ip} attempt {attempt}...')
-                    registry['node_data'][ip] = self.get_bootstrap_data(ip, name)
-                    bootstrapped_a_node = True
-                    break
-                except Exception:  # pylint: disable=broad-except
-                    if attempt >= 10:
-                        self.app.log.error(f'Timed out waiting for node {ip} to bootstrap.')
-                        break
-                    time.sleep(30)
-                    continue
-
-        if not bootstrapped_a_node:
+        self.app.log.info('Creation complete, waiting for the nodes to install and bootstrap...')
+
+        def register_node(ip, node_data):
+            self.app.log.info(f'Bootstrapped node {ip}')
+            registry['node_data'][ip] = node_data
+            self.app.network.register(name, registry)
+
+        self.app.network.wait_for_nodes(registry['ips'], lambda ip: self.get_bootstrap_data(ip, name),
+                                        int(self.app.config.get('provision', 'bootstrap_timeout')),
+                                        on_ready=register_node)
+
+        if not registry['node_data']:
             raise HydraError(f'Bootstrapping failed for all nodes')
 
         registry['bootstrapped'] = datetime.utcnow().strftime('%c')
@@ -203,14 +203,44 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
                         'dest': 'cmd'
                     }
             ),
+            (
+                    ['--parallel'],
+                    {
+                        'help': 'number of nodes to run on at once',
+                        'action': 'store',
+                        'dest': 'parallel',
+                        'type': int
+                    }
+            ),
+            (
+                    ['--timeout'],
+                    {
+                        'help': 'seconds to let the command run on each node',
+                        'action': 'store',
+                        'dest': 'timeout',
+                        'type': float
+                    }
+            ),
         ]
     )
     def run_on_all_nodes(self):
         name = self.app.utils.env_or_arg('name', 'HYDRA_NETWORK', or_path='.hydra_network')
         networks = self.app.network.read_networks_file()
+        workers = self.app.pargs.parallel or int(self.app.config.get('provision', 'ssh_workers'))
+
+        def print_result(ip, result):
+            # The json output handler only renders the final results
+            if self.app.output.Meta.label == 'json':
+                return
+            status = 'timed out' if result['status'] is None and result['seconds'] else f'exit {result["status"]}'
+            print(f'==> {ip} ({status}) <==\n{result["stdout"]}{result["stderr"]}', flush=True)
 
-        for ip in networks[name]['ips']:
-            self.app.network.run_command(ip, self.app.pargs.cmd)
+        results = self.app.network.run_on_nodes(networks[name]['ips'], self.app.pargs.cmd, workers,
+                                                timeout=self.app.pargs.timeout, on_result=print_result)
+
+        if any(result['status'] != 0 for result in results.values()):
+            self.app.exit_code = 1
+        self.app.smart_render(results, 'run-summary.jinja2')
 
     def get_bootstrap_data(self, ip, network_name):
         return json.loads(self.app.network.run_command(ip, f'cat /data/{network_name}/.bootstrap.json'))
@@ -267,6 +297,14 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
                         'dest': 'version'
                     }
             ),
+            (
+                    ['--jumpstart-peers'],
+                    {
+                        'help': 'list the nodes as peers serving jumpstarts (see client serve-jumpstart)',
+                        'action': 'store_true',
+                        'dest': 'jumpstart_peers'
+                    }
+            ),
         ]
     )
     def publish(self):
@@ -279,6 +317,9 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
 
         network = networks[name]
         network['version'] = self.app.pargs.version or 'latest'
+        if self.app.pargs.jumpstart_peers:
+            port = self.app.config.get('client', 'jumpstart_port')
+            network['jumpstart_peers'] = [f'http://{ip}:{port}' for ip in network['ips']]
 
         os.chdir(self.app.utils.path())
         os.makedirs(f'./networks/{name}', exist_ok=True)
@@ -319,44 +360,69 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
             self.app.log.error(f'You must choose a valid network name: {networks.keys()}')
             return
 
-        for index, ip in enumerate(networks[name]['ips']):
-            if index == 0:
-                self.app.network.scp(ip, f'oracle_eth_priv_{index}.key', f'/data/{name}/oracle_eth_priv.key')
-            self.app.network.run_command(ip, f'hydra client configure '
-                                             f'--name={name}{" --as-oracle" if index == 0 else ""} 2>&1')
+        oracle_ip, *ips = networks[name]['ips']
+        workers = int(self.app.config.get('provision', 'ssh_workers'))
+        results = {}
+
+        # The oracle is configured first; the other nodes don't depend on each other
+        self.app.network.scp(oracle_ip, 'oracle_eth_priv_0.key', f'/data/{name}/oracle_eth_priv.key')
+        results[oracle_ip] = self.app.network.execute(oracle_ip,
+                                                      f'hydra client configure --name={name} --as-oracle 2>&1')
+        results.update(self.app.network.run_on_nodes(ips, f'hydra client configure --name={name} 2>&1', workers))
+        self._check_configured(results)
 
         # Wait for network to activate chainconfig
         time.sleep(10)
 
+        chain_id = self.app.config['provision']['chain_id']
+        gateway = self.app.config['provision']['gateway']
         registration_requirement = self.app.config['provision']['dpos']['registration_requirement']
         max_yearly_rewards = self.app.config['provision']['dpos']['max_yearly_rewards']
         lock_time = self.app.config['provision']['dpos']['lock_time']
         fee = self.app.config['provision']['dpos']['fee']
         referral_fee = self.app.config['provision']['dpos']['referral_fee']
-        for index, ip in enumerate(networks[name]['ips']):
-            if index == 0:
-                self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain dpos3 set-registration-requirement "
-                                             f"{registration_requirement} -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-                self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain dpos3 set-max-yearly-reward "
-                                             f"{max_yearly_rewards} -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-
-                self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain gateway update-mainnet-address {self.app.config['provision']['gateway']['mainnet_tg_contract_hex_address']} gateway -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-                self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain gateway update-mainnet-address {self.app.config['provision']['gateway']['mainnet_lctg_contract_hex_address']} loomcoin-gateway -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-
-                for node in networks[name]['node_data']:
-                    address = networks[name]['node_data'][node]['hex_address']
-                    self.app.network.run_command(ip, f'cd /data/{name}; ./shipchain dpos3 change-whitelist-info {address} '
-                                                     f"{registration_requirement} {lock_time} -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
 
-                self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain addressmapper add-identity-mapping "
-                                                 f"`hydra client cat-key loomhex` oracle_eth_priv.key -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-
-
-            self.app.network.run_command(ip, f'cd /data/{name}; ./shipchain dpos3 update-candidate-info '
-                                             f'shipchain-node-{index + 1} "Official ShipChain bootstrap node" '
-                                             f"\"www.shipchain.io\" {referral_fee} -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
-            self.app.network.run_command(ip, f"cd /data/{name}; ./shipchain dpos3 change-fee {fee} -k node_priv.key --chain {self.app.config['provision']['chain_id']}")
+        def node_commands(index):
+            return [
+                f'./shipchain dpos3 update-candidate-info shipchain-node-{index + 1} '
+                f'"Official ShipChain bootstrap node" "www.shipchain.io" {referral_fee} -k node_priv.key '
+                f'--chain {chain_id}',
+                f'./shipchain dpos3 change-fee {fee} -k node_priv.key --chain {chain_id}',
+            ]
 
+        # Each node's commands run as one script over a single channel, from the network's data directory
+        oracle_commands = [
+            f'./shipchain dpos3 set-registration-requirement {registration_requirement} -k node_priv.key '
+            f'--chain {chain_id}',
+            f'./shipchain dpos3 set-max-yearly-reward {max_yearly_rewards} -k node_priv.key --chain {chain_id}',
+            f'./shipchain gateway update-mainnet-address {gateway["mainnet_tg_contract_hex_address"]} gateway '
+            f'-k node_priv.key --chain {chain_id}',
+            f'./shipchain gateway update-mainnet-address {gateway["mainnet_lctg_contract_hex_address"]} '
+            f'loomcoin-gateway -k node_priv.key --chain {chain_id}',
+        ] + [
+            f'./shipchain dpos3 change-whitelist-info {node_data["hex_address"]} {registration_requirement} '
+            f'{lock_time} -k node_priv.key --chain {chain_id}'
+            for node_data in networks[name]['node_data'].values()
+        ] + [
+            f'./shipchain addressmapper add-identity-mapping `hydra client cat-key loomhex` oracle_eth_priv.key '
+            f'-k node_priv.key --chain {chain_id}',
+        ] + node_commands(0)
+
+        # The oracle whitelists every node before they register as candidates
+        results = {oracle_ip: self.app.network.run_script(oracle_ip, oracle_commands, directory=f'/data/{name}')}
+        results.update(self.app.network.run_scripts({ip: node_commands(index)
+                                                     for index, ip in enumerate(ips, start=1)},
+                                                    workers, directory=f'/data/{name}'))
+        self._check_configured(results)
+
+    def _check_configured(self, results):
+        for ip, result in results.items():
+            if result['status'] == 0:
+                continue
+            failed = [step['cmd'] for step in result.get('steps', []) if step['status']]
+            self.app.log.error(f'Configuring {ip} failed: '
+                               f'{"; ".join(failed) or (result["stderr"] or result["stdout"]).strip()}')
+            self.app.exit_code = 1
 
     @ex(
         help='Update local networks.json with published bootstrap information',
@@ -381,12 +447,139 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
         name = self.app.utils.env_or_arg('name', 'HYDRA_NETWORK', or_path='.hydra_network')
 
         try:
-            url = f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/hydra.json'
-            network_registry = json.loads(requests.get(url).content)
+            network_registry = json.loads(self.app.mirrors.get_metadata(f'networks/{name}/hydra.json'))
             self.app.network.register(name, network_registry)
         except Exception as exc:
             raise HydraError(f'Unable to pull updated registry information: {exc}')
 
+    def _jumpstart_parent(self, s3, name, jumps_json):
+        """The archive a new incremental jumpstart builds on and its file listing, or None for a new base"""
+        if 'latest' not in jumps_json:
+            return None, None
+
+        parent = jumps_json['latest']
+        chain = jumpstart_chain(jumps_json, 'latest')
+        if len(chain) >= self.app.pargs.max_chain:
+            self.app.log.info(f'Jumpstart chain has {len(chain)} archives, building a new base snapshot')
+            return None, None
+
+        try:
+            listing_obj = s3.Object(self.app.release.dist_bucket, f'jumpstart/{name}/{parent}.files.json').get()
+        except s3.meta.client.exceptions.NoSuchKey:
+            self.app.log.info(f'No file listing for {parent}, building a new base snapshot')
+            return None, None
+        return parent, json.loads(listing_obj['Body'].read().decode('utf-8'))
+
+    @staticmethod
+    def _jumpstart_parts(include, listing):
+        """
+        Group the paths of a jumpstart into the archives of a split jumpstart: one per database directory, plus
+        one for the remaining files.  Paths with no files on the node are left out.
+        """
+        parts, other = [], []
+        for path in include:
+            if not any(file_path == path or file_path.startswith(f'{path}/') for file_path in listing):
+                continue
+            if jumpstart_component(path):
+                parts.append((jumpstart_component(path), [path]))
+            else:
+                other.append(path)
+        if other:
+            parts.append(('config', other))
+        return parts
+
+    def _snapshot_jumpstart_data(self, ip, name, include):
+        """
+        Snapshot the `include` paths of the node's data to JUMPSTART_SNAPSHOT for packaging while the node runs.
+        LevelDB table files are never modified once written, so they are hardlinked; the rest (logs, MANIFEST,
+        CURRENT, genesis files) is copied.
+        """
+        self.app.log.info(f'Snapshotting {name} data to {JUMPSTART_SNAPSHOT}')
+        output = self.app.network.run_command(
+            ip, f"cd /data/{name} && rm -rf {JUMPSTART_SNAPSHOT} && mkdir {JUMPSTART_SNAPSHOT} && "
+                f"for path in {' '.join(include)}; do "
+                f"if [ -e $path ]; then cp -al --parents $path {JUMPSTART_SNAPSHOT}/ || exit 1; fi; done && "
+                f"cd {JUMPSTART_SNAPSHOT} && "
+                f"find . -type f ! -name '*.ldb' ! -name '*.sst' | while read -r file; do "
+                f"cp -p --remove-destination \"../$file\" \"$file\" || exit 1; done && "
+                f"echo snapshot complete")
+        # run_command does not report the exit status
+        if 'snapshot complete' not in output:
+            raise HydraError(f'Unable to snapshot {name} data')
+
+    def _build_jumpstart_archive(self, ip, name, directory, codec, tarfile, include):
+        """
+        Build `tarfile` from the `include` paths of `directory` on the node at `ip`, upload it and return its
+        jumps.json metadata.  Where the codec can write to stdout the archive is streamed from the node straight
+        into a multipart upload and never written to disk; its checksums are computed on the way.
+        """
+        key = f'jumpstart/{name}/{tarfile}'
+        piece_size = self.app.download.piece_size
+
+        if codec.streams:
+            self.app.log.info(f'Building and uploading {tarfile}')
+            digest = StreamDigest(piece_size)
+            with self.app.network.stream_command(
+                    ip, f"cd {directory} && {codec.compress_command('-', include)}") as output:
+                self.app.release.upload_stream(key, output, digest=digest, ACL='public-read')
+            # Published so clients can verify the archive as it downloads
+            archive = {'codec': codec.name, 'size': digest.size, 'sha256': digest.hexdigest()}
+            piece_hashes = digest.piece_hashes
+
+        else:
+            s3_destination = f's3://{self.app.release.dist_bucket}/{key}'
+
+            self.app.log.info(f'Building {tarfile}')
+            build = self.app.network.execute(ip, f"cd {directory} && {codec.compress_command(tarfile, include)}")
+            if build['status'] != 0:
+                raise HydraError(f'Building {tarfile} failed with status {build["status"]}: {build["stderr"]}')
+
+            archive = {'codec': codec.name}
+            if codec.name == 'pgzip':
+                archive['members'] = [int(size) for size in build['stdout'].split()]
+
+            # Published so clients can verify the archive as it downloads
+            checksum = self.app.network.run_command(ip, f"cd {directory}; "
+                                                    f"stat -c %s {tarfile} && sha256sum {tarfile}").split()
+            archive['size'] = int(checksum[0])
+            archive['sha256'] = checksum[1]
+
+            piece_hashes = self.app.network.run_command(
+                ip, f"cd {directory}; python3 -c \"import hashlib, sys; f = open(sys.argv[1], 'rb'); "
+                    f"[print(hashlib.sha256(b).hexdigest()) for b in iter(lambda: f.read({piece_size}), b'')]\" "
+                    f"{tarfile}").split()
+
+            # The AMI does not include awscli by default
+            self.app.log.info(f'Ensuring AWS CLI is available')
+            if self.app.network.log_command(ip, "sudo apt-get -y install awscli") != 0:
+                raise HydraError(f'Unable to install awscli on {ip}')
+
+            self.app.log.info(f'Uploading {tarfile} to {s3_destination}')
+            status = self.app.network.log_command(ip, f"cd {directory} && aws s3 cp {tarfile} {s3_destination} "
+                                                      f"--acl public-read --only-show-errors")
+            if status != 0:
+                raise HydraError(f'Uploading {tarfile} to {s3_destination} failed with status {status}')
+
+            self.app.log.info(f'Cleaning up {tarfile}')
+            self.app.network.run_command(ip, f"cd {directory}; rm -f {tarfile}")
+
+        # Per-piece hashes let clients verify pieces fetched from peer validators individually
+        archive['piece_size'] = piece_size
+        archive['piece_hashes'] = f'{tarfile}.pieces.json'
+        self.app.release.s3_resource().Object(
+            self.app.release.dist_bucket, f'jumpstart/{name}/{archive["piece_hashes"]}').put(
+                ACL='public-read',
+                Body=json.dumps(piece_hashes).encode('utf-8'),
+                ContentType='application/json',
+            )
+        return archive
+
+    def _upload_file_list(self, ip, destination, paths):
+        with tempfile.NamedTemporaryFile('w+') as list_file:
+            list_file.write(''.join(f'{path}\n' for path in paths))
+            list_file.flush()
+            self.app.network.scp(ip, list_file.name, destination)
+
     @ex(
         help='generate_jumpstart',
         arguments=[
@@ -398,6 +591,42 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
                         'dest': 'name'
                     }
             ),
+            (
+                    ['--codec'],
+                    {
+                        'help': 'compression used for the jumpstart archive',
+                        'action': 'store',
+                        'dest': 'codec',
+                        'default': 'gzip',
+                        'choices': list(CODECS),
+                    }
+            ),
+            (
+                    ['--incremental'],
+                    {
+                        'help': 'only package the files added or changed since the latest jumpstart',
+                        'action': 'store_true',
+                        'dest': 'incremental'
+                    }
+            ),
+            (
+                    ['--max-chain'],
+                    {
+                        'help': 'build a new base snapshot once an incremental chain has this many archives',
+                        'action': 'store',
+                        'dest': 'max_chain',
+                        'type': int,
+                        'default': 8,
+                    }
+            ),
+            (
+                    ['--split'],
+                    {
+                        'help': 'publish one archive per database so clients can fetch and extract them concurrently',
+                        'action': 'store_true',
+                        'dest': 'split'
+                    }
+            ),
         ]
     )
     def generate_jumpstart(self):
@@ -419,51 +648,87 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
         block_height = json.loads(self.app.network.run_command(ip, 'hydra -o json client status'))["node_block_height"]
         self.app.log.info(f'Current block height {block_height}')
 
-        # We don't want to package live databases
-        self.app.log.info(f'Stopping node before packaging jumpstart')
-        self.app.network.run_command(ip, f'hydra client stop-service --name {name} 2>&1')
+        jumpstart_include = [
+            'genesis.json',
+            'app.db',
+            'evm.db',
+            'receipts_db',
+            'chaindata/config/genesis.json',
+            'chaindata/data/blockstore.db',
+            'chaindata/data/evidence.db',
+            'chaindata/data/fnConsensus.db',
+            'chaindata/data/state.db',
+            'chaindata/data/tx_index.db',
+        ]
+        snapshot = f'/data/{name}/{JUMPSTART_SNAPSHOT}'
 
+        # We don't want to package live databases, but the node only has to be stopped while they are snapshotted
+        self.app.log.info(f'Stopping node to snapshot its data')
+        self.app.network.run_command(ip, f'hydra client stop-service --name {name} 2>&1')
         try:
-            tarfile = f'{datetime.today().strftime("%Y-%m-%d")}_{block_height}_{name}.tar.gz'
-            s3_destination = f's3://{self.app.release.dist_bucket}/jumpstart/{name}/{tarfile}'
-
-            jumpstart_include = [
-                'genesis.json',
-                'app.db',
-                'evm.db',
-                'receipts_db',
-                'chaindata/config/genesis.json',
-                'chaindata/data/blockstore.db',
-                'chaindata/data/evidence.db',
-                'chaindata/data/fnConsensus.db',
-                'chaindata/data/state.db',
-                'chaindata/data/tx_index.db',
-            ]
-
-            self.app.log.info(f'Building {tarfile}')
-            self.app.network.run_command(ip, f"cd /data/{name}; "
-                                         f"tar -zcf {tarfile} "
-                                         f"{' '.join(jumpstart_include)}")
-
-            # The AMI does not include awscli by default
-            self.app.log.info(f'Ensuring AWS CLI is available')
-            self.app.network.run_command(ip, f"sudo apt-get -y install awscli 2>&1")
-
-            self.app.log.info(f'Uploading {tarfile} to {s3_destination}')
-            self.app.network.run_command(ip, f"cd /data/{name}; aws s3 cp {tarfile} {s3_destination} --acl public-read")
-
-            self.app.log.info(f'Cleaning up {tarfile}')
-            self.app.network.run_command(ip, f"cd /data/{name}; rm -f {tarfile}")
+            self._snapshot_jumpstart_data(ip, name, jumpstart_include)
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.error(f'Jumpstart generation failed {exc}')
+            self.app.exit_code = 1
+            self.app.network.run_command(ip, f'rm -rf {snapshot}')
+            return
+        finally:
+            self.app.log.info(f'Restarting node service')
+            self.app.network.run_command(ip, f'hydra client start-service --name {name} 2>&1')
 
-            s3 = self.app.release.get_boto().resource('s3')
+        codec = CODECS[self.app.pargs.codec]()
+        try:
+            s3 = self.app.release.s3_resource()
             try:
                 jumps_obj = s3.Object(self.app.release.dist_bucket, f'jumpstart/{name}/jumps.json').get()
                 jumps_json = json.loads(jumps_obj['Body'].read().decode('utf-8'))
             except s3.meta.client.exceptions.NoSuchKey:
                 jumps_json = {}
 
+            # The file listing of every jumpstart is kept so the next one can be built as a delta against it
+            listing = parse_file_listing(self.app.network.run_command(
+                ip, f"cd {snapshot}; find {' '.join(jumpstart_include)} -type f -printf '%p %s %T@\\n'"))
+            parent, deleted = None, []
+            if self.app.pargs.incremental:
+                parent, previous_listing = self._jumpstart_parent(s3, name, jumps_json)
+                if parent:
+                    changed, deleted = diff_file_listing(previous_listing, listing)
+                    self.app.log.info(f'{len(changed)} files changed and {len(deleted)} deleted since {parent}')
+                    self._upload_file_list(ip, f'{snapshot}/{DELTA_DELETED_LIST}', deleted)
+                    self._upload_file_list(ip, f'{snapshot}/.jumpstart-files', changed + [DELTA_DELETED_LIST])
+                    jumpstart_include = ['--files-from=.jumpstart-files']
+
+            tarfile = (f'{datetime.today().strftime("%Y-%m-%d")}_{block_height}_{name}'
+                       f'{"-delta" if parent else ""}{codec.suffix}')
+
+            if getattr(codec, 'binary', None):
+                self.app.log.info(f'Ensuring {codec.binary} is available')
+                if self.app.network.log_command(ip, f"sudo apt-get -y install {codec.binary}") != 0:
+                    raise HydraError(f'Unable to install {codec.binary} on {ip}')
+
+            # Deltas only hold the files changed since their parent, so only base snapshots are worth splitting
+            if self.app.pargs.split and not parent:
+                archive = {'codec': codec.name, 'parts': []}
+                for part_name, part_include in self._jumpstart_parts(jumpstart_include, listing):
+                    part_file = f'{tarfile[:-len(codec.suffix)]}-{part_name}{codec.suffix}'
+                    part = self._build_jumpstart_archive(ip, name, snapshot, codec, part_file, part_include)
+                    part.update(file=part_file, paths=part_include)
+                    archive['parts'].append(part)
+                archive['size'] = sum(part['size'] for part in archive['parts'])
+            else:
+                archive = self._build_jumpstart_archive(ip, name, snapshot, codec, tarfile, jumpstart_include)
+            if parent:
+                archive['parent'] = parent
+
+            s3.Object(self.app.release.dist_bucket, f'jumpstart/{name}/{tarfile}.files.json').put(
+                ACL='public-read',
+                Body=json.dumps(listing).encode('utf-8'),
+                ContentType='application/json',
+            )
+
             jumps_json[block_height] = tarfile
             jumps_json['latest'] = tarfile
+            jumps_json.setdefault('archives', {})[tarfile] = archive
 
             s3.Object(self.app.release.dist_bucket, f'jumpstart/{name}/jumps.json').put(
                 ACL='public-read',
@@ -473,9 +738,10 @@ class Network(Controller):  # pylint: disable=too-many-ancestors
 
             self.app.log.info(f'Jumpstart generation complete!')
 
-        except Exception as exc:
+        except Exception as exc:  # pylint: disable=broad-except
             self.app.log.error(f'Jumpstart generation failed {exc}')
+            self.app.exit_code = 1
 
         finally:
-            self.app.log.info(f'Restarting node service')
-            self.app.network.run_command(ip, f'hydra client start-service --name {name} 2>&1')
+            self.app.log.info(f'Cleaning up {snapshot}')
+            self.app.network.run_command(ip, f'rm -rf {snapshot}')
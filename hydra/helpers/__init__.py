@@ -1,15 +1,20 @@
+import json
 import os
 import subprocess
 import urllib.parse
 
 import libtmux
-import requests
 from colored import fg, attr
 from pyfiglet import Figlet
 from tqdm import tqdm
 
 from hydra.core.exc import HydraError
 
+try:
+    import bsdiff4
+except ImportError:  # pragma: nocover
+    bsdiff4 = None
+
 
 def fig(text, font='slant'):
     return Figlet(font=font).renderText(text)
@@ -115,44 +120,119 @@ class UtilsHelper(HydraHelper):
 
     def download_file(self, destination, url):
         self.app.log.debug(f'Downloading: {destination} from {url}')
-        open(destination, 'wb+').write(requests.get(url).content)
+        open(destination, 'wb+').write(self.app.http.get(url).content)
 
-    def download_file_stream(self, destination, url, show_progress=True):
+    def download_file_stream(self, destination, url, show_progress=True, sha256=None, size=None):
         """
-        Download a file from a URL.  This supports
+        Download a file from a URL.  This supports segmented downloads over multiple connections when the
+        server accepts byte ranges, see `DownloadHelper.fetch`
         :param destination:
         :param url:
+        :param sha256: expected checksum, verified before the file is moved to `destination`
+        :param size: expected size in bytes
         :return:
         """
         self.app.log.info(f'Downloading: {destination}')
-        with requests.get(url, stream=True) as request_stream, open(destination, 'wb') as file_stream:
-            total_bytes = request_stream.headers['Content-Length']
-            self.app.log.debug(f'Retrieving {total_bytes} bytes from {url}')
-            with TqdmProgressBar(unit='B', unit_scale=True, miniters=1, desc=destination) as progressbar:
-                self._copyfileobj_progress(request_stream.raw, file_stream, total_bytes, progressbar)
+        self.app.download.fetch(destination, url, show_progress=show_progress, sha256=sha256, size=size)
+
+    def release_path(self, file, version=None):  # pylint: disable=no-self-use
+        """Path of a release file on the channel"""
+        if not version or version == "latest":
+            return f'latest/{file}'
+        return f'archive/{urllib.parse.quote(version)}/{file}'
 
-    def _copyfileobj_progress(self, source_stream, destination_stream, total_bytes, progressbar, chunk_size=16 * 1024):
+    def download_release_file(self, destination, file, version=None, installed=None):
         """
-        copy data from file-like object source_stream to file-like object destination_stream
-        Borrowed from shutil.copyfileobj and modified for progressbar support
+        Download a release file, verified against the release manifest.  If `installed` is the path of the
+        currently installed copy of `file` and the release publishes a binary patch from that version, only
+        the patch is downloaded and applied.
         """
-        chunks_processed = 1
-        while 1:
-            buf = source_stream.read(chunk_size)
-            if not buf:
-                break
-            destination_stream.write(buf)
-            progressbar.update_to(chunks_processed, chunk_size, int(total_bytes))
-            chunks_processed += 1
-
-    def download_release_file(self, destination, file, version=None):
-        host = self.config.get('hydra', 'channel_url')
-        if not version or version == "latest":
-            url = f'{host}/latest/{file}'
-        else:
-            version = urllib.parse.quote(version)
-            url = f'{host}/archive/{version}/{file}'
-        return self.download_file_stream(destination, url)
+        host = self.app.mirrors.origin
+
+        manifest = self.get_release_manifest(version)
+        release_version = manifest.get('version')
+        checksum = manifest.get('checksums', {}).get(f'./{file}', {})
+
+        # Release files are immutable per version, so a cached copy can be installed without downloading
+        if release_version:
+            cached = self.app.cache.lookup(host, release_version, file, sha256=checksum.get('sha256'))
+            if cached:
+                self.app.log.info(f'Installing {file} {release_version} from cache')
+                self.app.cache.install(cached, destination)
+                return
+
+        if not (installed and self.patch_release_file(destination, file, installed, manifest)):
+            self.app.log.info(f'Downloading: {destination}')
+            self.app.mirrors.fetch(destination, self.release_path(file, version),
+                                   sha256=checksum.get('sha256'), size=checksum.get('size'))
+
+        if release_version:
+            self.app.cache.store(host, release_version, file, destination, sha256=checksum.get('sha256'))
+
+    def patch_release_file(self, destination, file, installed, manifest):
+        """
+        Build `destination` by applying the manifest's bsdiff patch for the version of the `installed` binary.
+        Returns False, leaving nothing behind, if no usable patch is published or the result does not match
+        the manifest checksum.
+        """
+        from .cache import file_sha256  # cache.py imports HydraHelper from this module
+
+        patches = manifest.get('patches', {}).get(f'./{file}', {})
+        checksum = manifest.get('checksums', {}).get(f'./{file}', {})
+        if not patches or not checksum.get('sha256'):
+            return False
+        if not bsdiff4:
+            self.app.log.warning(f'A patch is published for {file} but bsdiff4 is not installed, '
+                                 f'downloading it in full')
+            return False
+
+        try:
+            installed_version = self.get_binary_version(installed)
+        except (IOError, subprocess.SubprocessError) as exc:
+            self.app.log.debug(f'Unable to determine version of {installed}: {exc}')
+            return False
+
+        patch = patches.get(installed_version)
+        if not patch or file_sha256(installed) != patch['from_sha256']:
+            self.app.log.debug(f'No patch published from {file} {installed_version}')
+            return False
+
+        self.app.log.info(f'Patching {file} {installed_version} to {manifest.get("version")}')
+        patch_path = f'{destination}.bsdiff'
+        # Patched into a new file and moved into place, as `destination` may be a hardlink to a cached blob
+        patched_path = f'{destination}.patched'
+        try:
+            self.app.log.info(f'Downloading: {patch_path}')
+            self.app.mirrors.fetch(patch_path, self.release_path(patch['file'][2:], manifest.get('version')),
+                                   sha256=patch['sha256'], size=patch['size'])
+            bsdiff4.file_patch(installed, patched_path, patch_path)
+
+            if file_sha256(patched_path) != checksum['sha256']:
+                self.app.log.warning(f'Patched {file} does not match the release checksum, downloading it in full')
+                return False
+            os.replace(patched_path, destination)
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.warning(f'Unable to apply patch for {file}, downloading it in full: {exc}')
+            return False
+        finally:
+            for path in (patch_path, patched_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        return True
+
+    def get_release_manifest(self, version=None):
+        """Retrieve the manifest.json published for a release, or an empty manifest if it isn't available"""
+        path = self.release_path('manifest.json', version)
+
+        try:
+            manifest = json.loads(self.app.mirrors.get_metadata(path))
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'Unable to retrieve release manifest {path}: {exc}')
+            manifest = {}
+
+        if version and version != 'latest':
+            manifest.setdefault('version', version)
+        return manifest
 
     def get_binary_version(self, path):
         if not os.path.exists(path):
@@ -0,0 +1,346 @@
+import gzip
+import os
+import shutil
+import subprocess
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from hydra.core.exc import HydraError
+
+try:
+    import zstandard
+except ImportError:  # pragma: nocover
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: nocover
+    lz4 = None
+
+
+CODEC_SUFFIXES = [
+    ('zstd', '.tar.zst'),
+    ('lz4', '.tar.lz4'),
+    ('pgzip', '.tar.gz'),
+    ('gzip', '.tar.gz'),
+]
+
+# Included in incremental jumpstarts, lists the files deleted since the parent snapshot
+DELTA_DELETED_LIST = '.jumpstart-deleted'
+
+# Directories with these suffixes are databases, the components a jumpstart can be restored selectively by
+DATABASE_SUFFIXES = ('.db', '_db')
+
+
+def codec_for_file(file_name):
+    for codec, suffix in CODEC_SUFFIXES:
+        if codec != 'pgzip' and file_name.endswith(suffix):
+            return codec
+    return 'gzip'
+
+
+def jumpstart_archive(jumps_json, block):
+    """
+    Resolve the archive published for `block` in a jumps.json document.  `jumps_json[block]` is always the archive
+    file name so older clients keep working; any additional metadata lives under `jumps_json['archives']`.
+    """
+    return archive_metadata(jumps_json, jumps_json[block])
+
+
+def archive_metadata(jumps_json, file_name):
+    archive = {'file': file_name, 'codec': codec_for_file(file_name)}
+    archive.update(jumps_json.get('archives', {}).get(file_name, {}))
+    return archive
+
+
+def jumpstart_component(path):
+    """The database a jumpstart path belongs to, e.g. `state.db` for `chaindata/data/state.db/000001.ldb`"""
+    for segment in os.path.normpath(path).split(os.sep):
+        if segment.endswith(DATABASE_SUFFIXES):
+            return segment
+    return None
+
+
+def archive_files(jumps_json):
+    """
+    {file name: metadata} of every archive file published in a jumps.json document.  A split jumpstart publishes
+    one archive per database, listed as `parts` of its metadata, instead of a single file.
+    """
+    files = {}
+    for file_name, archive in jumps_json.get('archives', {}).items():
+        if 'parts' in archive:
+            files.update((part['file'], part) for part in archive['parts'])
+        else:
+            files[file_name] = archive
+    return files
+
+
+def jumpstart_chain(jumps_json, block):
+    """
+    Resolve the archives needed to reach `block`, base snapshot first.  Incremental (delta) archives name the
+    archive they apply on top of as `parent` in their metadata; full archives have no parent.
+    """
+    chain = [jumpstart_archive(jumps_json, block)]
+    while chain[0].get('parent'):
+        parent = chain[0]['parent']
+        if any(archive['file'] == parent for archive in chain):
+            raise HydraError(f'Jumpstart chain for block {block} loops at {parent}')
+        chain.insert(0, archive_metadata(jumps_json, parent))
+    return chain
+
+
+def parse_file_listing(output):
+    """Parse `find -printf '%p %s %T@\\n'` output into a {path: [size, mtime]} listing"""
+    listing = {}
+    for line in output.splitlines():
+        fields = line.rsplit(' ', 2)
+        if len(fields) == 3:
+            listing[fields[0]] = [int(fields[1]), fields[2]]
+    return listing
+
+
+def diff_file_listing(previous, current):
+    """Return the paths in `current` that are new or changed since `previous`, and the paths that were deleted"""
+    changed = sorted(path for path, stat in current.items() if previous.get(path) != stat)
+    deleted = sorted(path for path in previous if path not in current)
+    return changed, deleted
+
+
+class ArchiveCodec(ABC):
+    """Decompresses a compressed tar stream.  `open` yields a readable file-like object of the tar data."""
+    name = None
+    suffix = '.tar'
+    # Whether compress_command can write the archive to stdout (`tarfile` '-')
+    streams = True
+
+    def __init__(self, archive=None, shares=1):
+        self.archive = archive or {}
+        # The number of archives decompressed at once, which split the CPUs and memory between them
+        self.shares = shares
+
+    @contextmanager
+    def open(self, fileobj):
+        yield fileobj
+
+    @abstractmethod
+    def compress_command(self, tarfile, include):
+        """Shell command run on a node to build `tarfile` from the `include` paths"""
+
+
+class GzipCodec(ArchiveCodec):
+    name = 'gzip'
+    suffix = '.tar.gz'
+
+    @contextmanager
+    def open(self, fileobj):
+        with gzip.GzipFile(fileobj=fileobj, mode='rb') as stream:
+            yield stream
+
+    def compress_command(self, tarfile, include):
+        return f"tar -zcf {tarfile} {' '.join(include)}"
+
+
+class ExternalCodec(ArchiveCodec):
+    """Codec backed by a python module when installed, otherwise by piping through the command line tool"""
+    binary = None
+
+    @abstractmethod
+    def open_module(self, fileobj):
+        """Context manager yielding the decompressed stream of `fileobj` using the python module"""
+
+    @property
+    def module_available(self):
+        return False
+
+    @contextmanager
+    def open(self, fileobj):
+        if self.module_available:
+            with self.open_module(fileobj) as stream:
+                yield stream
+            return
+
+        if not shutil.which(self.binary):
+            raise HydraError(f'Decompressing {self.name} archives requires the python "{self.name}" package '
+                             f'or the `{self.binary}` command')
+
+        with self._pipe(fileobj) as stream:
+            yield stream
+
+    @contextmanager
+    def _pipe(self, fileobj, chunk_size=1024 * 1024):
+        process = subprocess.Popen([self.binary, '-d', '-c'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        feed_errors = []
+
+        def feed():
+            try:
+                while True:
+                    buf = fileobj.read(chunk_size)
+                    if not buf:
+                        break
+                    process.stdin.write(buf)
+            except Exception as exc:  # pylint: disable=broad-except
+                feed_errors.append(exc)
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            feeder.join()
+            returncode = process.wait()
+
+        if feed_errors:
+            raise feed_errors[0]
+        if returncode:
+            raise HydraError(f'`{self.binary}` exited with status {returncode}')
+
+
+class ZstdCodec(ExternalCodec):
+    name = 'zstd'
+    suffix = '.tar.zst'
+    binary = 'zstd'
+
+    @property
+    def module_available(self):
+        return zstandard is not None
+
+    @contextmanager
+    def open_module(self, fileobj):
+        with zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True) as stream:
+            yield stream
+
+    def compress_command(self, tarfile, include):
+        # -T0 compresses with one thread per core
+        return f"tar -I 'zstd -T0 -3' -cf {tarfile} {' '.join(include)}"
+
+
+class Lz4Codec(ExternalCodec):
+    name = 'lz4'
+    suffix = '.tar.lz4'
+    binary = 'lz4'
+
+    @property
+    def module_available(self):
+        return lz4 is not None
+
+    @contextmanager
+    def open_module(self, fileobj):
+        with lz4.frame.LZ4FrameFile(fileobj, mode='rb') as stream:
+            yield stream
+
+    def compress_command(self, tarfile, include):
+        return f"tar -I lz4 -cf {tarfile} {' '.join(include)}"
+
+
+class ParallelGzipCodec(GzipCodec):
+    """
+    Multi-member gzip: the tar stream is cut into fixed size blocks that are gzipped independently (in parallel)
+    and concatenated, which is still a valid .tar.gz for any gzip reader.  The compressed length of each member is
+    published in `archive['members']`, so members can be inflated concurrently; zlib releases the GIL while it
+    works.  Without member lengths this falls back to serial gzip decompression.
+
+    Each inflated member is a whole block held in memory, so at most `max_inflight_bytes` worth of blocks are
+    inflated ahead of the reader, however many workers there are: about 512MB plus their compressed input.  When
+    `shares` archives are decompressed at once, each gets that share of the CPUs and of the budget.
+    """
+    name = 'pgzip'
+    block_size = '64M'
+    block_bytes = 64 * 1024 * 1024
+    max_inflight_bytes = 512 * 1024 * 1024
+    # Member sizes are measured from the compressed blocks on disk
+    streams = False
+
+    def __init__(self, archive=None, workers=None, shares=1):
+        super().__init__(archive, shares)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // shares)
+        self.max_inflight_bytes = type(self).max_inflight_bytes // shares
+
+    @contextmanager
+    def open(self, fileobj):
+        members = self.archive.get('members')
+        if not members:
+            with super().open(fileobj) as stream:
+                yield stream
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hydra-inflate') as executor:
+            yield ParallelGzipReader(fileobj, members, executor, lookahead=self.lookahead)
+
+    @property
+    def lookahead(self):
+        return max(1, min(self.workers, self.max_inflight_bytes // self.block_bytes))
+
+    def compress_command(self, tarfile, include):
+        # Members are named so that shell globbing returns them in order; their compressed sizes are printed
+        # one per line so the caller can publish them.
+        prefix = f'{tarfile}.member.'
+        return (f"tar -cf - {' '.join(include)} | split -b {self.block_size} -a 6 -d - {prefix} && "
+                f"ls {prefix}* | xargs -P $(nproc) -n 1 gzip -6 && "
+                f"stat -c %s {prefix}* && "
+                f"cat {prefix}* > {tarfile} && rm -f {prefix}*")
+
+
+class ParallelGzipReader:
+    """Reads gzip members sequentially from `fileobj` and inflates up to `lookahead` of them concurrently,
+    returning the decompressed data in order.  Memory use is bounded by `lookahead` members in flight, each
+    holding its compressed data and then its inflated data, plus the inflated member being read."""
+
+    def __init__(self, fileobj, members, executor, lookahead):
+        self.fileobj = fileobj
+        self.members = deque(members)
+        self.executor = executor
+        self.lookahead = lookahead
+        self.pending = deque()
+        self.buffer = memoryview(b'')
+
+    @staticmethod
+    def inflate(data):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        result = decompressor.decompress(data) + decompressor.flush()
+        if not decompressor.eof:
+            raise HydraError('Truncated gzip member in jumpstart archive')
+        return result
+
+    def _schedule(self):
+        while self.members and len(self.pending) < self.lookahead:
+            length = self.members.popleft()
+            data = self.fileobj.read(length)
+            while len(data) < length:
+                more = self.fileobj.read(length - len(data))
+                if not more:
+                    raise HydraError('Jumpstart archive ended before its last gzip member')
+                data += more
+            self.pending.append(self.executor.submit(self.inflate, data))
+
+    def read(self, size=-1):
+        if not self.buffer:
+            self._schedule()
+            if not self.pending:
+                return b''
+            self.buffer = memoryview(self.pending.popleft().result())
+            self._schedule()
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk.tobytes()
+
+
+CODECS = {codec.name: codec for codec in (GzipCodec, ParallelGzipCodec, ZstdCodec, Lz4Codec)}
+
+
+def get_codec(archive, shares=1):
+    codec = archive.get('codec', 'gzip')
+    if codec not in CODECS:
+        raise HydraError(f'Unsupported jumpstart codec {codec}, try updating hydra')
+    return CODECS[codec](archive, shares=shares)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from . import HydraHelper
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for buf in iter(lambda: source.read(chunk_size), b''):
+            digest.update(buf)
+    return digest.hexdigest()
+
+
+class CacheHelper(HydraHelper):
+    """
+    Content-addressed local cache of release files.  Files are stored once under `blobs/` by sha256 and the
+    index maps a (channel, version, file) key to its hash.  When the cache grows beyond `cache.max_size` the
+    least recently used entries are evicted.
+    """
+
+    _lock = threading.Lock()
+
+    def path(self, *extra_paths):
+        return os.path.join(os.path.expanduser(self.config.get('cache', 'path')), *extra_paths)
+
+    @property
+    def max_size(self):
+        return int(self.config.get('cache', 'max_size'))
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def blob_path(self, sha256):
+        return self.path('blobs', sha256[:2], sha256)
+
+    @staticmethod
+    def key(channel, version, file):
+        return f'{channel}|{version}|{file}'
+
+    def read_index(self):
+        try:
+            with open(self.path('index.json'), 'r') as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        os.makedirs(self.path(), exist_ok=True)
+        with open(self.path('index.json.tmp'), 'w+') as index_file:
+            json.dump(index, index_file, indent=2)
+        os.replace(self.path('index.json.tmp'), self.path('index.json'))
+
+    def lookup(self, channel, version, file, sha256=None):
+        """Return the cached blob path for a release file, or None.  If `sha256` is given it must also match."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            index = self.read_index()
+            entry = index.get(self.key(channel, version, file))
+            if not entry or (sha256 and entry['sha256'] != sha256):
+                return None
+
+            blob = self.blob_path(entry['sha256'])
+            if not os.path.exists(blob) or os.path.getsize(blob) != entry['size']:
+                index.pop(self.key(channel, version, file))
+                self.write_index(index)
+                return None
+
+            entry['last_used'] = time.time()
+            self.write_index(index)
+            return blob
+
+    def store(self, channel, version, file, source, sha256=None):
+        """Add the file at `source` to the cache and return its blob path"""
+        if not self.enabled:
+            return None
+
+        sha256 = sha256 or file_sha256(source)
+        blob = self.blob_path(sha256)
+
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                self._link_or_copy(source, f'{blob}.tmp')
+                os.replace(f'{blob}.tmp', blob)
+
+            index = self.read_index()
+            index[self.key(channel, version, file)] = {
+                'sha256': sha256,
+                'size': os.path.getsize(blob),
+                'last_used': time.time(),
+            }
+            self._evict(index)
+            self.write_index(index)
+
+        self.app.log.debug(f'Cached {file} {version} as {sha256}')
+        return blob
+
+    def install(self, blob, destination):
+        """Place a cached blob at `destination`, hardlinking when possible"""
+        self._link_or_copy(blob, destination)
+
+    @staticmethod
+    def _link_or_copy(source, destination):
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+
+    def _evict(self, index):
+        blob_sizes = {}
+        for entry in index.values():
+            blob_sizes[entry['sha256']] = entry['size']
+
+        total_size = sum(blob_sizes.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+            if total_size <= self.max_size:
+                break
+            index.pop(key)
+            if all(other['sha256'] != entry['sha256'] for other in index.values()):
+                total_size -= entry['size']
+                try:
+                    os.remove(self.blob_path(entry['sha256']))
+                except FileNotFoundError:
+                    pass
+                self.app.log.debug(f'Evicted {key} from cache')
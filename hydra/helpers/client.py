@@ -7,8 +7,11 @@ import socket
 import stat
 import subprocess
 import tarfile
+import threading
 import time
+import zlib
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from io import StringIO
 from shutil import rmtree
@@ -18,15 +21,33 @@ import requests
 import toml
 import yaml
 from requests.auth import HTTPBasicAuth
-from tqdm import tqdm
 
 from hydra.core.exc import HydraError
 from hydra.core.version import get_version
 import hydra.main
-from . import HydraHelper
+from . import HydraHelper, TqdmProgressBar
+from .archive import DELTA_DELETED_LIST, archive_files, get_codec, jumpstart_chain, jumpstart_component
+from .download import ProgressReader
+from .peer import serve_files, verified_archives
 
 
 class ClientHelper(HydraHelper):
+    # Records which jumpstart archives were applied to a node directory
+    JUMPSTART_STATE = '.jumpstart.json'
+    JUMPSTART_DATA = ('app.db', 'evm.db', 'receipts_db', 'chaindata/data')
+    # Base snapshots are extracted here and swapped in with renames, the data they replace is moved to the trash
+    JUMPSTART_STAGING = '.jumpstart-staging'
+    JUMPSTART_TRASH = '.jumpstart-trash'
+    # Databases a jumpstart can be restored selectively by, and the ones each role needs (None for all of them).
+    # Validators don't serve receipt or transaction lookups, which RPC and archive nodes need receipts_db and
+    # tx_index.db for.
+    JUMPSTART_COMPONENTS = ('app.db', 'evm.db', 'receipts_db', 'blockstore.db', 'evidence.db', 'fnConsensus.db',
+                            'state.db', 'tx_index.db')
+    JUMPSTART_ROLES = {
+        'validator': ('app.db', 'evm.db', 'blockstore.db', 'evidence.db', 'fnConsensus.db', 'state.db'),
+        'rpc': None,
+    }
+
     def pip_update_hydra(self):
         pip = self.config.get('client', 'pip_install') % self.config['hydra']
         self.app.log.info(f'Updating pip from remote {pip}')
@@ -236,14 +257,48 @@ class ClientHelper(HydraHelper):
 
         open('node_priv.key', 'w+').write(validator['priv_key']['value'])
 
-    def jumpstart(self, name, network_directory, block):
+    def jumpstart_components(self, role=None, components=None):
+        """
+        Resolve a `--jumpstart-role` and/or comma separated `--jumpstart-components` to the set of databases to
+        restore, or None to restore all of them
+        """
+        if role and role not in self.JUMPSTART_ROLES:
+            raise HydraError(f'Unknown jumpstart role {role}, choose from {", ".join(self.JUMPSTART_ROLES)}')
+        selected = set(self.JUMPSTART_ROLES[role] or self.JUMPSTART_COMPONENTS) if role else set()
+        for component in (components or '').split(','):
+            component = component.strip()
+            if component and component not in self.JUMPSTART_COMPONENTS:
+                raise HydraError(f'Unknown jumpstart component {component}, '
+                                 f'choose from {", ".join(self.JUMPSTART_COMPONENTS)}')
+            if component:
+                selected.add(component)
+
+        if not selected or selected == set(self.JUMPSTART_COMPONENTS):
+            return None
+        return selected
+
+    def jumpstart(self, name, network_directory, block, stream=False, keep_archive=False, share=False,
+                  components=None):
+        """
+        Replace the node data in `network_directory` with a published jumpstart.
+        With `stream` the archive is extracted as it downloads instead of being saved to disk first, and
+        `keep_archive` keeps a copy of the downloaded archive in the node directory.  With `share` the verified
+        archive is added to the store served to other validators by `serve_jumpstart`.
+        Downloads also pull pieces from the `jumpstart_peers` published in the network's hydra.json.
+        If `block` is an incremental jumpstart, the deltas after the last archive applied to this node are
+        applied on top of its data, or the whole chain from its base snapshot if there is none.  Files the
+        target snapshot doesn't list are then pruned, and if its data still doesn't match the listing the whole
+        chain is applied again.
+        A base snapshot is extracted to a staging directory and swapped in once complete, so the node keeps its
+        data if the jumpstart fails, and the replaced data is deleted in the background.
+        With `components` (see `jumpstart_components`) only those databases are restored; the archives of a split
+        jumpstart holding none of them are not downloaded at all.
+        """
         self.app.log.info(f'Attempting to jumpstart {name} to block: {block}.')
 
-        url = f'{self.app.config["hydra"]["channel_url"]}/jumpstart/{name}/jumps.json'
-
         # Get the published jumpstart data
         try:
-            jumps_json = json.loads(requests.get(url).content)
+            jumps_json = json.loads(self.app.mirrors.get_metadata(f'jumpstart/{name}/jumps.json'))
         except Exception as exc:  # pylint: disable=broad-except
             self.app.log.debug(f'Jumpstart metadata retrieval failed with: {exc}')
             self.app.log.warning(f'No jumpstart data found for network {name}.  Continuing without jumpstart')
@@ -252,44 +307,360 @@ class ClientHelper(HydraHelper):
         if block not in jumps_json:
             raise HydraError(f'Network {name} does not have jumpstart for block {block}')
 
+        peers = [] if stream else self._jumpstart_peers(name)
+        store = self.jumpstart_store(name) if share else None
+
         # Next operations will all occur within the node directory for this network
         os.chdir(network_directory)
 
-        # Get the jumpstart gzipped tar file
-        url = f'{self.app.config["hydra"]["channel_url"]}/jumpstart/{name}/{jumps_json[block]}'
-        jumpstart_tarfile = jumps_json[block]
+        # Incremental jumpstarts only need the archives after the last one this node applied
+        chain = jumpstart_chain(jumps_json, block)
+        applied = self._applied_jumpstarts(name, chain, components)
+        if len(applied) == len(chain):
+            self.app.log.info(f'Jumpstart {chain[-1]["file"]} was already applied, applying it again')
+            applied = applied[:-1]
+        # Deltas are checked against the listing of the target snapshot once applied
+        listing = self._jumpstart_listing(name, chain[-1]) if applied else None
+        if applied and listing is None:
+            self.app.log.info(f'No file listing published for {chain[-1]["file"]}, applying full jumpstart')
+            applied = []
+        if applied:
+            self.app.log.info(f'Applying {len(chain) - len(applied)} incremental jumpstart(s) '
+                              f'on top of {applied[-1]["file"]}')
+
+        self._apply_jumpstart_chain(name, chain, len(applied), stream, keep_archive, peers, store, components)
+        if listing is not None and not self._prune_jumpstart_data(listing, components):
+            self.app.log.warning(f'Node data does not match jumpstart {chain[-1]["file"]} after applying deltas, '
+                                 f'applying full jumpstart')
+            self._apply_jumpstart_chain(name, chain, 0, stream, keep_archive, peers, store, components)
+        elif listing is not None:
+            self._record_jumpstart(name, chain, components)
+
+        self.app.log.info(f'Jumpstarting network complete!')
+
+    def _apply_jumpstart_chain(self, name, chain, start, stream, keep_archive, peers, store, components):
+        """Apply the archives of `chain` from index `start`, recording each one once applied"""
+        for index in range(start, len(chain)):
+            archive = chain[index]
+            path = f'jumpstart/{name}/{archive["file"]}'
+            self.app.log.debug(f'Jumpstart {archive["file"]} uses codec {archive["codec"]}')
 
+            # Only the base snapshot replaces the existing data, deltas are extracted over it
+            replace = index == 0
+            directory = self.JUMPSTART_STAGING if replace else '.'
+            if replace:
+                rmtree(self.JUMPSTART_STAGING, ignore_errors=True)
+
+            try:
+                if archive.get('parts'):
+                    self._split_jumpstart(path, archive, keep_archive, directory, peers, store, stream, components)
+                elif stream:
+                    self._stream_jumpstart(path, archive, keep_archive, directory, store, components)
+                else:
+                    self._download_jumpstart(path, archive, keep_archive, directory, peers, store, components)
+            except Exception:
+                if replace:
+                    rmtree(self.JUMPSTART_STAGING, ignore_errors=True)
+                raise
+
+            if replace:
+                if os.path.exists(self.JUMPSTART_STATE):
+                    os.remove(self.JUMPSTART_STATE)
+                self._swap_jumpstart_data()
+                self._empty_jumpstart_trash()
+            if archive.get('parent'):
+                self._apply_jumpstart_deletions()
+            self._record_jumpstart(name, chain[:index + 1], components)
+
+    def _applied_jumpstarts(self, name, chain, components=None):
+        """
+        Return the leading archives of `chain` that were already applied to the node in the current directory.
+        The LevelDB table files recorded after the last jumpstart must be unchanged, otherwise the node has
+        compacted them away since and the chain is applied from its base again.  So must the restored components,
+        as deltas can't complete a database the base snapshot left out.
+        """
         try:
-            self.app.utils.download_file_stream(jumpstart_tarfile, url)
-        except Exception as exc:
-            raise HydraError(f'Unable to download jumpstart file {jumpstart_tarfile}: {exc}')
+            with open(self.JUMPSTART_STATE, 'r') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return []
+
+        applied = state.get('applied', [])
+        if state.get('network') != name or applied != [archive['file'] for archive in chain[:len(applied)]]:
+            return []
+        if state.get('components') != (sorted(components) if components else None):
+            self.app.log.info(f'Jumpstart components changed since jumpstart {applied[-1]}, applying full jumpstart')
+            return []
+
+        for path, size in state.get('files', {}).items():
+            if not os.path.isfile(path) or os.path.getsize(path) != size:
+                self.app.log.info(f'Node data changed since jumpstart {applied[-1]}, applying full jumpstart')
+                return []
+
+        return chain[:len(applied)]
+
+    def _record_jumpstart(self, name, applied, components=None):
+        # Table files are immutable in LevelDB; only their presence and size need checking later
+        files = {}
+        for data_dir in self.JUMPSTART_DATA:
+            for root, _, file_names in os.walk(data_dir):
+                for file_name in file_names:
+                    if file_name.endswith(('.ldb', '.sst')):
+                        path = os.path.join(root, file_name)
+                        files[path] = os.path.getsize(path)
+
+        with open(f'{self.JUMPSTART_STATE}.tmp', 'w+') as state_file:
+            json.dump({'network': name, 'applied': [archive['file'] for archive in applied], 'files': files,
+                       'components': sorted(components) if components else None}, state_file)
+        os.replace(f'{self.JUMPSTART_STATE}.tmp', self.JUMPSTART_STATE)
+
+    def _jumpstart_listing(self, name, archive):
+        """The {path: [size, mtime]} listing published with a jumpstart archive, or None if there is none"""
+        try:
+            return json.loads(self.app.mirrors.get_metadata(f'jumpstart/{name}/{archive["file"]}.files.json'))
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'Jumpstart file listing retrieval failed with: {exc}')
+            return None
 
-        # Cleanup existing data that we're overwriting from jumpstart
-        for delete_dir in ['app.db', 'receipts_db', 'chaindata/data']:
+    def _prune_jumpstart_data(self, listing, components=None):
+        """
+        Delete the files in the database directories that aren't in the snapshot `listing`, such as the logs and
+        manifests LevelDB wrote since the last jumpstart.  Return whether every restored file of the listing is
+        then present with its listed size.
+        """
+        for data_dir in self.JUMPSTART_DATA:
+            for root, _, file_names in os.walk(data_dir):
+                for file_name in file_names:
+                    path = os.path.join(root, file_name)
+                    if path not in listing:
+                        self.app.log.debug(f'Removing {path}, which is not in the jumpstart')
+                        os.remove(path)
+
+        for path, (size, _) in listing.items():
+            if self._wanted_jumpstart_paths([path], components) and \
+                    (not os.path.isfile(path) or os.path.getsize(path) != size):
+                return False
+        return True
+
+    def _apply_jumpstart_deletions(self):
+        # A delta lists the files the source node deleted since its parent snapshot
+        try:
+            with open(DELTA_DELETED_LIST, 'r') as deleted_list:
+                deleted = deleted_list.read().splitlines()
+        except FileNotFoundError:
+            return
+
+        for path in deleted:
+            path = os.path.normpath(path)
+            if not path or os.path.isabs(path) or path.startswith('..'):
+                raise HydraError(f'Refusing to delete {path} outside of the node directory')
             try:
-                rmtree(os.path.join(network_directory, delete_dir))
-            except FileNotFoundError as exc:
-                self.app.log.debug(f'{exc}')
-            except IOError as exc:
-                raise HydraError(f'Cleanup of existing data failed: {exc}')
-
-        # Extract jumpstart over network directory
-        self.app.log.info(f'Extracting jumpstart contents')
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        os.remove(DELTA_DELETED_LIST)
+
+    def _jumpstart_peers(self, name):
         try:
-            with tarfile.open(jumpstart_tarfile) as tar:
-                tar_members = tar.getmembers()
-                for member in tqdm(iterable=tar_members, total=(len(tar_members) - 1)):
-                    tar.extract(member=member)
-        except tarfile.TarError as exc:
-            raise HydraError(f'Unable to extract jumpstart file {jumpstart_tarfile}: {exc}')
-
-        # Cleanup jumpstart gzipped tar file
+            return json.loads(self.app.mirrors.get_metadata(f'networks/{name}/hydra.json')).get('jumpstart_peers', [])
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'No jumpstart peers for {name}: {exc}')
+            return []
+
+    def _peer_sources(self, path, archive, peers):
+        """Arguments for `DownloadHelper.fetch` to pull pieces of `archive` from `peers`, if it has piece hashes"""
+        if not peers or not archive.get('piece_hashes'):
+            return {}
+
+        try:
+            piece_hashes = json.loads(self.app.mirrors.get_metadata(
+                f'{os.path.dirname(path)}/{archive["piece_hashes"]}'))
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'Piece hashes unavailable, not using peers: {exc}')
+            return {}
+
+        self.app.log.info(f'Downloading from {len(peers)} peer(s) as well')
+        return {
+            'peers': [f'{peer.rstrip("/")}/{path}' for peer in peers],
+            'piece_hashes': piece_hashes,
+            'piece_size': archive['piece_size'],
+        }
+
+    def _download_jumpstart(self, path, archive, keep_archive, directory='.', peers=None, store=None,
+                            components=None, shares=1):
+        jumpstart_tarfile = archive['file']
+        try:
+            self.app.log.info(f'Downloading: {jumpstart_tarfile}')
+            self.app.mirrors.fetch(jumpstart_tarfile, path, sha256=archive.get('sha256'), size=archive.get('size'),
+                                   **self._peer_sources(path, archive, peers))
+        except Exception as exc:
+            raise HydraError(f'Unable to download jumpstart file {jumpstart_tarfile}: {exc}')
+
+        self.app.log.info(f'Extracting {jumpstart_tarfile}')
+        with open(jumpstart_tarfile, 'rb') as archive_file, \
+                TqdmProgressBar(unit='B', unit_scale=True, miniters=1, desc=jumpstart_tarfile,
+                                total=os.path.getsize(jumpstart_tarfile)) as progressbar:
+            self._extract_jumpstart(ProgressReader(archive_file, progressbar), archive, directory, components,
+                                    shares)
+
+        if store:
+            self.share_jumpstart(store, jumpstart_tarfile)
+        if keep_archive:
+            return
+
+        # Cleanup jumpstart tar file
         try:
             os.remove(jumpstart_tarfile)
         except OSError as exc:
             self.app.log.warning(f'Unable to cleanup jumpstart tar. {exc}')
 
-        self.app.log.info(f'Jumpstarting network complete!')
+    def _stream_jumpstart(self, path, archive, keep_archive, directory='.', store=None, components=None,
+                          shares=1):
+        jumpstart_tarfile = archive['file']
+
+        self.app.log.info(f'Streaming and extracting {jumpstart_tarfile}')
+        try:
+            with self.app.download.open_stream(self.app.mirrors.url(path), desc=jumpstart_tarfile,
+                                               keep=jumpstart_tarfile if keep_archive or store else None,
+                                               sha256=archive.get('sha256')) as reader:
+                self._extract_jumpstart(reader, archive, directory, components, shares)
+        except (IOError, requests.RequestException) as exc:
+            raise HydraError(f'Unable to download jumpstart file {jumpstart_tarfile}: {exc}')
+
+        if store:
+            self.share_jumpstart(store, jumpstart_tarfile)
+            if not keep_archive:
+                os.remove(jumpstart_tarfile)
+
+    def _split_jumpstart(self, path, archive, keep_archive, directory='.', peers=None, store=None, stream=False,
+                         components=None):
+        """
+        Apply a split jumpstart, which publishes one archive per database.  Up to `download.archive_workers`
+        archives are downloaded and extracted at once, largest first, so the biggest database does not hold up
+        the others.  The archives extracted at once share the CPUs and memory budget of their codecs.
+        """
+        # Each archive extracts into its own directories, but concurrent extraction could race to create the
+        # parents they share
+        for part in archive['parts']:
+            for part_path in part.get('paths', []):
+                os.makedirs(os.path.join(directory, os.path.dirname(part_path)), exist_ok=True)
+
+        parts = sorted(archive['parts'], key=lambda part: part.get('size', 0), reverse=True)
+        if components:
+            skipped = [part for part in parts if not self._wanted_jumpstart_paths(part.get('paths'), components)]
+            if skipped:
+                self.app.log.info(f'Skipping {len(skipped)} archives of components that are not needed '
+                                  f'({sum(part.get("size", 0) for part in skipped) / 1024 / 1024:.0f}MB)')
+            parts = [part for part in parts if part not in skipped]
+        workers = max(1, min(self.app.download.archive_workers, len(parts)))
+        self.app.log.info(f'Applying {len(parts)} archives of {archive["file"]}, {workers} at a time')
+
+        def apply_part(part):
+            part_path = f'{os.path.dirname(path)}/{part["file"]}'
+            if stream:
+                self._stream_jumpstart(part_path, part, keep_archive, directory, store, components, workers)
+            else:
+                self._download_jumpstart(part_path, part, keep_archive, directory, peers, store, components,
+                                         workers)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hydra-jumpstart') as executor:
+            futures = [executor.submit(apply_part, part) for part in parts]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def jumpstart_store(self, name):
+        """Directory of the verified jumpstart archives this node serves to its peers"""
+        return self.app.cache.path('jumpstart', name)
+
+    def share_jumpstart(self, store, jumpstart_tarfile):
+        os.makedirs(store, exist_ok=True)
+        self.app.cache.install(jumpstart_tarfile, os.path.join(store, jumpstart_tarfile))
+        self.app.log.info(f'Added {jumpstart_tarfile} to the jumpstart store {store}')
+
+    def serve_jumpstart(self, name, bind, port):
+        """Serve the archives in the jumpstart store of `name` that match their published checksums"""
+        try:
+            jumps_json = json.loads(self.app.mirrors.get_metadata(f'jumpstart/{name}/jumps.json'))
+        except Exception as exc:  # pylint: disable=broad-except
+            raise HydraError(f'Unable to retrieve jumpstart metadata for {name}: {exc}')
+
+        store = self.jumpstart_store(name)
+        archives = verified_archives(store, archive_files(jumps_json), self.app.log)
+        if not archives:
+            raise HydraError(f'No verified jumpstart archives in {store}, apply one with --share-jumpstart first')
+
+        for file_name in archives:
+            self.app.log.info(f'Serving {file_name}')
+        self.app.log.info(f'Listening on {bind}:{port}')
+        serve_files({f'/jumpstart/{name}/{file_name}': path for file_name, path in archives.items()},
+                    bind, port, self.app.log)
+
+    @staticmethod
+    def _wanted_jumpstart_paths(paths, components):
+        # Paths outside of any database, such as the genesis files, are always restored
+        if not components or not paths:
+            return True
+        return any(jumpstart_component(path) in components or not jumpstart_component(path) for path in paths)
+
+    def _extract_jumpstart(self, fileobj, archive, directory='.', components=None, shares=1):
+        try:
+            with get_codec(archive, shares).open(fileobj) as tar_stream, \
+                    tarfile.open(fileobj=tar_stream, mode='r|') as tar:
+                for member in tar:
+                    if self._wanted_jumpstart_paths([member.name], components):
+                        tar.extract(member=member, path=directory)
+        except (tarfile.TarError, EOFError, OSError, zlib.error) as exc:
+            raise HydraError(f'Unable to extract jumpstart file {archive["file"]}: {exc}')
+
+    def _swap_jumpstart_data(self):
+        """
+        Move the snapshot extracted to JUMPSTART_STAGING into place with renames, moving the node data it replaces
+        to JUMPSTART_TRASH.  If a rename fails, every rename made so far is undone.
+        """
+        trash = os.path.join(self.JUMPSTART_TRASH, datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+        renamed = []
+
+        def rename(source, destination):
+            os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+            os.rename(source, destination)
+            renamed.append((source, destination))
+
+        self.app.log.info(f'Swapping in jumpstart data')
+        try:
+            for data_dir in self.JUMPSTART_DATA:
+                if os.path.exists(data_dir):
+                    rename(data_dir, os.path.join(trash, data_dir))
+                if os.path.exists(os.path.join(self.JUMPSTART_STAGING, data_dir)):
+                    rename(os.path.join(self.JUMPSTART_STAGING, data_dir), data_dir)
+
+            # Anything else in the snapshot, such as the genesis files, replaces single files
+            for root, _, file_names in os.walk(self.JUMPSTART_STAGING):
+                for file_name in file_names:
+                    staged = os.path.join(root, file_name)
+                    path = os.path.relpath(staged, self.JUMPSTART_STAGING)
+                    if os.path.exists(path):
+                        rename(path, os.path.join(trash, path))
+                    rename(staged, path)
+        except OSError as exc:
+            for source, destination in reversed(renamed):
+                os.rename(destination, source)
+            raise HydraError(f'Unable to swap in jumpstart data, the node data was left unchanged: {exc}')
+
+        rmtree(self.JUMPSTART_STAGING, ignore_errors=True)
+
+    def _empty_jumpstart_trash(self):
+        """Delete the node data replaced by jumpstarts in a background thread, which hydra waits for on exit"""
+        if not os.path.exists(self.JUMPSTART_TRASH):
+            return
+
+        self.app.log.info(f'Deleting replaced node data in the background')
+        threading.Thread(target=rmtree, args=(os.path.abspath(self.JUMPSTART_TRASH),), kwargs={'ignore_errors': True},
+                         name='hydra-trash').start()
 
     def _setup_oracle_loom_yaml(self):
         with open('loom.yaml', 'r+') as config_file:
@@ -335,11 +706,11 @@ class ClientHelper(HydraHelper):
 
         if not peers:
             # Get the published peering data
-            url = f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/hydra.json'
+            path = f'networks/{name}/hydra.json'
             try:
-                remote_config = json.loads(requests.get(url).content)
+                remote_config = json.loads(self.app.mirrors.get_metadata(path))
             except Exception as exc:  # pylint: disable=broad-except
-                self.app.log.warning(f'Error getting network details from {url}: {exc}')
+                self.app.log.warning(f'Error getting network details from {path}: {exc}')
                 return
             peers = [(ip, validator['pubkey'], validator['nodekey'])
                      for ip, validator in remote_config['node_data'].items()]
@@ -353,24 +724,15 @@ class ClientHelper(HydraHelper):
         self.update_node_helper_files(version)
 
         # CHAINDATA/CONFIG/GENESIS.json
-        self._copy_genesis(
-            f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/chaindata/config/genesis.json',
-            'chaindata/config/genesis.json'
-        )
+        self._copy_genesis(f'networks/{name}/chaindata/config/genesis.json', 'chaindata/config/genesis.json')
 
         # LOOM.YAML
-        self._copy_yaml(
-            f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/loom.yaml',
-            'loom.yaml'
-        )
+        self._copy_yaml(f'networks/{name}/loom.yaml', 'loom.yaml')
         if kwargs['oracle'] if 'oracle' in kwargs else False:
             self._setup_oracle_loom_yaml()
 
         # GENESIS.json
-        self._copy_genesis(
-            f'{self.app.config["hydra"]["channel_url"]}/networks/{name}/genesis.json',
-            'genesis.json'
-        )
+        self._copy_genesis(f'networks/{name}/genesis.json', 'genesis.json')
 
         # CONFIG.TOML
         self._configure_toml(kwargs['pex'] if 'pex' in kwargs else True,
@@ -404,8 +766,8 @@ class ClientHelper(HydraHelper):
             'loom_address_hex': f'0x{hex_addr[10:]}',
             'loom_address_b64': base64.b64encode(bytes.fromhex(hex_addr[10:])).decode()
         }
-        response = requests.post('https://registry.network.shipchain.io/validators/',
-                                 json=params)
+        response = self.app.http.post('https://registry.network.shipchain.io/validators/',
+                                      json=params)
         response_json = response.json()
 
         if response.status_code == 400:
@@ -417,15 +779,15 @@ class ClientHelper(HydraHelper):
 
             if 'node_key' in response_json and 'already exists' in response_json['node_key'][0]:
                 # Node exists, update instead of create
-                response = requests.put(f'https://registry.network.shipchain.io/validators/{params["node_key"]}',
-                                        json=params, auth=registry_auth)
+                response = self.app.http.put(f'https://registry.network.shipchain.io/validators/{params["node_key"]}',
+                                             json=params, auth=registry_auth)
                 if response.status_code != 200:
                     # TODO: handle error updating
                     self.app.log.error(f'Error from registry: {response.content}')
                     return None
             else:
-                response = requests.post('https://registry.network.shipchain.io/validators/',
-                                         json=params, auth=registry_auth)
+                response = self.app.http.post('https://registry.network.shipchain.io/validators/',
+                                              json=params, auth=registry_auth)
                 if response.status_code != 201:
                     # TODO: handle error creating
                     self.app.log.error(f'Error from registry: {response.content}')
@@ -460,22 +822,22 @@ class ClientHelper(HydraHelper):
                                    "before attempting to configure metrics")
                 return
 
-    def _copy_genesis(self, url, file):
-        self.app.log.info(f'Copying {url} to {file}')
+    def _copy_genesis(self, path, file):
+        self.app.log.info(f'Copying {path} to {file}')
         try:
-            genesis = json.loads(requests.get(url).content)
+            genesis = json.loads(self.app.mirrors.get_metadata(path))
         except Exception as exc:  # pylint: disable=broad-except
-            self.app.log.warning(f'Error getting network details from {url}: {exc}')
+            self.app.log.warning(f'Error getting network details from {path}: {exc}')
             return
 
         json.dump(genesis, open(file, 'w+'), indent=4)
 
-    def _copy_yaml(self, url, file):
-        self.app.log.info(f'Copying {url} to {file}')
+    def _copy_yaml(self, path, file):
+        self.app.log.info(f'Copying {path} to {file}')
         try:
-            contents = yaml.load(StringIO(requests.get(url).text))
+            contents = yaml.load(StringIO(self.app.mirrors.get_metadata(path).decode('utf-8')))
         except Exception as exc:  # pylint: disable=broad-except
-            self.app.log.warning(f'Error getting yaml from {url}: {exc}')
+            self.app.log.warning(f'Error getting yaml from {path}: {exc}')
             return
 
         open(file, 'w+').write(yaml.dump(contents, indent=4))
@@ -0,0 +1,748 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from hydra.core.exc import HydraError
+from . import HydraHelper, TqdmProgressBar
+
+
+def piece_ranges(total_bytes, piece_size):
+    """Split `total_bytes` into `(start, end)` byte ranges (end exclusive) of at most `piece_size`"""
+    return [(start, min(start + piece_size, total_bytes)) for start in range(0, total_bytes, piece_size)]
+
+
+def preallocate(file_stream, size):
+    """Reserve `size` bytes on disk for `file_stream`, falling back to a sparse file where unsupported"""
+    try:
+        os.posix_fallocate(file_stream.fileno(), 0, size)
+    except (AttributeError, OSError):
+        file_stream.truncate(size)
+
+
+def write_all(destination_stream, buf):
+    """Write all of `buf`; unbuffered (raw) files may accept only part of a write"""
+    written = destination_stream.write(buf)
+    while written is not None and written < len(buf):
+        written += destination_stream.write(buf[written:])
+
+
+def copy_stream(source_stream, destination_stream, progress, digest=None, offset=0, length=None,
+                min_chunk_size=64 * 1024, max_chunk_size=4 * 1024 * 1024):
+    """
+    Copy from `source_stream` to `destination_stream` through a single reusable buffer filled with `readinto`, so
+    no new bytes objects are created per chunk.  Reads start at `min_chunk_size` and double each time the source
+    fills the whole request, up to `max_chunk_size`.  `digest` (an OrderedDigest) is updated with the file
+    `offset` of each chunk and `progress` is called with each chunk's length.  Stops after `length` bytes if given,
+    otherwise at end of stream.  Returns the number of bytes copied.
+    """
+    view = memoryview(bytearray(max_chunk_size))
+    readinto = getattr(source_stream, 'readinto', None)
+    chunk_size = min_chunk_size
+    copied = 0
+    while length is None or copied < length:
+        wanted = chunk_size if length is None else min(chunk_size, length - copied)
+        if readinto:
+            num_bytes = readinto(view[:wanted])
+        else:
+            buf = source_stream.read(wanted)
+            num_bytes = len(buf)
+            view[:num_bytes] = buf
+        if not num_bytes:
+            break
+
+        chunk = view[:num_bytes]
+        write_all(destination_stream, chunk)
+        if digest:
+            digest.update(offset + copied, chunk)
+        copied += num_bytes
+        progress(num_bytes)
+
+        if num_bytes == wanted and chunk_size < max_chunk_size:
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+    return copied
+
+
+def parse_rate(rate):
+    """Parse a bytes/sec value such as `500K`, `10M` or `1048576`; 0 or empty means unlimited"""
+    if not rate:
+        return 0
+    rate = str(rate).strip().upper().rstrip('B')
+    multiplier = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(rate[-1:], 1)
+    if multiplier > 1:
+        rate = rate[:-1]
+    try:
+        return int(float(rate) * multiplier)
+    except ValueError:
+        raise HydraError(f'Invalid rate limit {rate}, expected bytes/sec such as 500K or 10M')
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the combined throughput of every connection of the downloads sharing it to `rate`
+    bytes/sec.
+    Up to one second of tokens can accumulate.  A chunk larger than the available tokens puts the bucket into
+    debt and the reader sleeps until it is paid off, so large chunks still average out to `rate`.
+    """
+
+    def __init__(self, rate):
+        self._rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.consumed = 0
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            self._tokens = min(self._tokens, rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def consume(self, num_bytes):
+        with self._lock:
+            self._refill()
+            self._tokens -= num_bytes
+            self.consumed += num_bytes
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class NodeLagMonitor(threading.Thread):
+    """
+    Polls the local node's `/status` every `interval` seconds and adjusts `limiter` (AIMD): while the node is
+    catching up or its block height stops advancing the rate is halved, down to `min_rate`; once it keeps up
+    the rate grows back in steps of a tenth of `max_rate`.
+    """
+
+    def __init__(self, app, limiter, max_rate, min_rate, status_url, interval=5):
+        super().__init__(name='hydra-node-lag', daemon=True)
+        self.app = app
+        self.limiter = limiter
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.status_url = status_url
+        self.interval = interval
+        self.stopped = threading.Event()
+        self._height = None
+
+    def lagging(self):
+        try:
+            sync_info = self.app.http.get(self.status_url, timeout=(1, 2)).json()['result']['sync_info']
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'Node status unavailable, not adjusting download rate: {exc}')
+            return None
+
+        height = int(sync_info['latest_block_height'])
+        stalled = self._height is not None and height <= self._height
+        self._height = height
+        return sync_info['catching_up'] or stalled
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            lagging = self.lagging()
+            if lagging is None:
+                continue
+
+            rate = self.limiter.rate
+            if lagging:
+                rate = max(self.min_rate, rate // 2)
+            else:
+                rate = min(self.max_rate, rate + self.max_rate // 10)
+            if rate != self.limiter.rate:
+                self.app.log.debug(f'Node {"lagging" if lagging else "keeping up"}, download rate now {rate} B/s')
+                self.limiter.rate = rate
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ThrottledProgress:
+    """
+    Thread-safe byte counter that forwards to `update` (e.g. a progress bar's) at most every `interval` seconds.
+    `flush` must be called when the transfer ends so the final count is reported.  With a `limiter` each call
+    blocks until the rate limit allows the bytes.
+    """
+
+    def __init__(self, update, interval=0.1, limiter=None):
+        self.update = update
+        self.interval = interval
+        self.limiter = limiter
+        self._pending = 0
+        self._reported_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, num_bytes):
+        if self.limiter:
+            self.limiter.consume(num_bytes)
+        with self._lock:
+            self._pending += num_bytes
+            now = time.monotonic()
+            if now - self._reported_at >= self.interval:
+                self._report(now)
+
+    def rewind(self, num_bytes):
+        """Take back bytes that were counted but discarded, e.g. a piece that failed verification"""
+        with self._lock:
+            self._pending -= num_bytes
+
+    def flush(self):
+        with self._lock:
+            self._report(time.monotonic())
+
+    def _report(self, now):
+        if self._pending:
+            self.update(self._pending)
+            self._pending = 0
+        self._reported_at = now
+
+
+def missing_ranges(completed, total_bytes):
+    """Return the `(start, end)` ranges of `total_bytes` not covered by the sorted `completed` ranges"""
+    missing = []
+    position = 0
+    for start, end in completed:
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < total_bytes:
+        missing.append((position, total_bytes))
+    return missing
+
+
+class PartialDownload:
+    """
+    On-disk state of an in-progress download.  Data is written to `<destination>.part` and the byte ranges that
+    have been written are recorded in the `<destination>.part.json` sidecar along with the URL and validators of
+    the remote file, so an interrupted download can be continued with range requests.  Downloads with a known
+    `sha256` can also be continued from a different URL (e.g. another mirror), the hash is verified at the end.
+    """
+
+    SAVE_INTERVAL = 1
+
+    def __init__(self, destination, url, total_bytes=None, etag=None, last_modified=None, sha256=None):
+        self.destination = destination
+        self.part_path = f'{destination}.part'
+        self.state_path = f'{destination}.part.json'
+        self.url = url
+        self.total_bytes = total_bytes
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = sha256
+        self.completed = []
+        self.digest = None
+        self.piece_hashes = None
+        self.piece_size = None
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+    @property
+    def completed_bytes(self):
+        return sum(end - start for start, end in self.completed)
+
+    @property
+    def missing(self):
+        return missing_ranges(self.completed, self.total_bytes)
+
+    def covers(self, start, end):
+        return any(completed[0] <= start and end <= completed[1] for completed in self.completed)
+
+    def resume(self):
+        """Load the sidecar state if it describes the same remote file, otherwise start over.  Returns True if
+        previously downloaded data will be reused."""
+        try:
+            with open(self.state_path, 'r') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            state = None
+
+        same_remote = state and (state.get('url') == self.url and
+                                 state.get('etag') == self.etag and
+                                 state.get('last_modified') == self.last_modified)
+        same_content = state and self.sha256 and state.get('sha256') == self.sha256
+        if (state and os.path.exists(self.part_path) and state.get('total_bytes') == self.total_bytes and
+                (same_remote or same_content)):
+            self.completed = [tuple(completed) for completed in state.get('completed', [])]
+            return bool(self.completed)
+
+        self.completed = []
+        return False
+
+    def mark(self, start, end):
+        """Record that bytes `start` to `end` have been written to the part file"""
+        with self._lock:
+            merged = []
+            for completed in sorted(self.completed + [(start, end)]):
+                if merged and completed[0] <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], completed[1]))
+                else:
+                    merged.append(completed)
+            self.completed = merged
+
+            if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        state = {
+            'url': self.url,
+            'total_bytes': self.total_bytes,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'sha256': self.sha256,
+            'completed': self.completed,
+        }
+        with open(f'{self.state_path}.tmp', 'w+') as state_file:
+            json.dump(state, state_file)
+        os.replace(f'{self.state_path}.tmp', self.state_path)
+        self._saved_at = time.monotonic()
+
+    def finish(self):
+        """Move the completed part file into place and discard the sidecar"""
+        os.replace(self.part_path, self.destination)
+        self.discard_state()
+
+    def discard(self):
+        """Throw away the part file and its state, e.g. after a failed verification"""
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+        self.discard_state()
+
+    def discard_state(self):
+        for path in (self.state_path, f'{self.state_path}.tmp'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class OrderedDigest:
+    """
+    sha256 of a file computed while it is written by concurrent workers.  Data is hashed in file order: chunks that
+    arrive ahead of the hash position are held in memory until the gap before them is filled, and workers call
+    `wait_for` before starting a piece so no more than `window` bytes are ever held.  Ranges that were already on
+    disk from a resumed download are read back from `path` when the hash position reaches them, by whichever thread
+    gets there first and without holding the lock, so other workers keep downloading meanwhile.
+    """
+
+    def __init__(self, path, resumed=None, window=None, start=0):
+        self.path = path
+        self.resumed = dict(resumed or [])
+        self.window = window
+        self.position = start
+        self.pending = {}
+        self._sha256 = hashlib.sha256()
+        self._condition = threading.Condition()
+        self._reading = False
+
+    def wait_for(self, start, failed=None):
+        with self._condition:
+            # A resumed download starts with its hash position behind every piece still to fetch
+            self._advance()
+            while self.window and start - self.position >= self.window:
+                if failed is not None and failed.is_set():
+                    return
+                self._condition.wait(timeout=1)
+
+    def update(self, offset, buf):
+        with self._condition:
+            if offset == self.position and not self._reading:
+                self._sha256.update(buf)
+                self.position += len(buf)
+            else:
+                self.pending[offset] = bytes(buf)
+            self._advance()
+            self._condition.notify_all()
+
+    def _advance(self):
+        # Called with the lock held; while a thread reads back a resumed range it owns the hash and position
+        while not self._reading:
+            if self.position in self.pending:
+                buf = self.pending.pop(self.position)
+                self._sha256.update(buf)
+                self.position += len(buf)
+            elif self.position in self.resumed:
+                end = self.resumed.pop(self.position)
+                self._reading = True
+                self._condition.release()
+                try:
+                    self._read_back(end)
+                finally:
+                    self._condition.acquire()
+                    self._reading = False
+                    self._condition.notify_all()
+            else:
+                return
+
+    def _read_back(self, end, chunk_size=1024 * 1024):
+        with open(self.path, 'rb') as file_stream:
+            file_stream.seek(self.position)
+            while self.position < end:
+                buf = file_stream.read(min(chunk_size, end - self.position))
+                if not buf:
+                    raise HydraError(f'{self.path} is shorter than its recorded progress')
+                self._sha256.update(buf)
+                self.position += len(buf)
+
+    def hexdigest(self):
+        with self._condition:
+            while self._reading:
+                self._condition.wait()
+            self._advance()
+            return self._sha256.hexdigest()
+
+
+class ProgressReader:
+    """File-like wrapper that counts the bytes read from `source_stream`, reports them to `progressbar` and
+    optionally writes a copy of everything read to `copy_stream`.  Reads are paced by `limiter` if given."""
+
+    def __init__(self, source_stream, progressbar, copy_stream=None, limiter=None):
+        self.source_stream = source_stream
+        self.progressbar = progressbar
+        self.copy_stream = copy_stream
+        self.limiter = limiter
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        buf = self.source_stream.read(size)
+        if buf:
+            self.bytes_read += len(buf)
+            self.sha256.update(buf)
+            if self.copy_stream:
+                self.copy_stream.write(buf)
+            self.progressbar.update(len(buf))
+            if self.limiter:
+                self.limiter.consume(len(buf))
+        return buf
+
+    def drain(self, chunk_size=1024 * 1024):
+        """Read anything left in the source, e.g. padding after the end of a tar archive"""
+        while self.read(chunk_size):
+            pass
+
+
+class DownloadHelper(HydraHelper):
+    def __init__(self, app):
+        super().__init__(app)
+        self._limiter_lock = threading.Lock()
+        self._limiter = None
+        self._monitor = None
+        self._transfers = 0
+
+    @property
+    def connections(self):
+        return max(1, int(self.config.get('download', 'connections')))
+
+    @property
+    def piece_size(self):
+        return int(self.config.get('download', 'piece_size'))
+
+    @property
+    def min_segmented_size(self):
+        return int(self.config.get('download', 'min_segmented_size'))
+
+    @property
+    def archive_workers(self):
+        return max(1, int(self.config.get('download', 'archive_workers')))
+
+    @contextmanager
+    def rate_limit(self):
+        """
+        Yield the RateLimiter for a transfer, or None when `download.rate_limit` is unset.  Concurrent transfers
+        share one limiter, so the limit applies to their combined throughput.  With `download.adaptive_rate` the
+        limit is also lowered while the local node falls behind.
+        """
+        max_rate = parse_rate(self.config.get('download', 'rate_limit'))
+        if not max_rate:
+            yield None
+            return
+
+        with self._limiter_lock:
+            if not self._transfers:
+                self._limiter = RateLimiter(max_rate)
+                if str(self.config.get('download', 'adaptive_rate')).lower() == 'true':
+                    self._monitor = NodeLagMonitor(self.app, self._limiter, max_rate,
+                                                   min(max_rate, parse_rate(self.config.get('download', 'min_rate'))),
+                                                   self.config.get('download', 'node_status_url'))
+                    self._monitor.start()
+                self.app.log.debug(f'Downloads limited to {max_rate} B/s{" (adaptive)" if self._monitor else ""}')
+            self._transfers += 1
+            limiter = self._limiter
+
+        try:
+            yield limiter
+        finally:
+            with self._limiter_lock:
+                self._transfers -= 1
+                if not self._transfers and self._monitor:
+                    self._monitor.stop()
+                    self._monitor = None
+
+    def probe(self, url):
+        """
+        Retrieve the size and validators of the file at `url` and whether the server supports byte range requests
+        :param url:
+        :return: dict with total_bytes, accepts_ranges, etag and last_modified
+        """
+        response = self.app.http.head(url)
+        response.raise_for_status()
+
+        return {
+            'total_bytes': int(response.headers.get('Content-Length', 0)) or None,
+            'accepts_ranges': response.headers.get('Accept-Ranges', 'none').lower() == 'bytes',
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+    def fetch(self, destination, url, show_progress=True, sha256=None, size=None, peers=None, piece_hashes=None,
+              piece_size=None):
+        """
+        Download a file from a URL.  If the server supports byte ranges and the file is large enough, the file is
+        split into pieces that are retrieved over `download.connections` concurrent connections.
+
+        Data is written to `<destination>.part` and only moved to `destination` once complete.  When the server
+        supports byte ranges an interrupted download of the same file is resumed from where it left off.
+
+        If `sha256` and/or `size` are given the download is verified before it is moved into place.  The hash is
+        computed as data is written, so verification does not read the file back (except for the parts of a
+        resumed download that were written by an earlier run).
+
+        With `piece_hashes` (the sha256 of each `piece_size` piece of the file) every piece is verified on its
+        own, and pieces are also requested from the `peers` URLs serving the same file.  A piece that a peer fails
+        to deliver intact is fetched again from `url`.
+        """
+        remote = self.probe(url)
+        total_bytes = remote['total_bytes']
+        if size is not None and total_bytes is not None and total_bytes != size:
+            raise HydraError(f'{url} is {total_bytes} bytes, expected {size}')
+
+        ranged = remote['accepts_ranges'] and total_bytes
+        if not (ranged and piece_hashes and piece_size):
+            peers, piece_hashes = [], None
+        segmented = ranged and (bool(peers) or self.connections > 1 and total_bytes >= self.min_segmented_size)
+
+        partial = PartialDownload(destination, url, total_bytes, remote['etag'], remote['last_modified'], sha256)
+        if ranged and partial.resume():
+            self.app.log.info(f'Resuming download of {destination} at {partial.completed_bytes} bytes')
+
+        if piece_hashes:
+            # Each piece is verified against its own hash, which covers the file hash as well
+            partial.piece_hashes, partial.piece_size = piece_hashes, piece_size
+        elif sha256:
+            partial.digest = OrderedDigest(partial.part_path, resumed=partial.completed,
+                                           window=self.connections * self.piece_size)
+
+        self.app.log.debug(f'Retrieving {total_bytes} bytes from {url} '
+                           f'({f"{self.connections} connections" if segmented else "single stream"}'
+                           f'{f", {len(peers)} peers" if peers else ""})')
+
+        with self.rate_limit() as limiter, \
+                TqdmProgressBar(unit='B', unit_scale=True, miniters=1, desc=destination, total=total_bytes,
+                                initial=partial.completed_bytes, disable=not show_progress) as progressbar:
+            if ranged:
+                self._fetch_ranged(partial, progressbar, segmented, limiter, peers)
+            else:
+                self._fetch_single(partial, progressbar, limiter)
+
+        self._verify(partial, None if piece_hashes else sha256, size)
+        partial.finish()
+
+    @staticmethod
+    def _verify(partial, sha256, size):
+        written = os.path.getsize(partial.part_path)
+        if size is not None and written != size:
+            partial.discard()
+            raise HydraError(f'Downloaded {partial.destination} is {written} bytes, expected {size}')
+
+        if sha256:
+            actual = partial.digest.hexdigest()
+            if actual != sha256:
+                partial.discard()
+                raise HydraError(f'Checksum mismatch for {partial.destination}: expected sha256 {sha256}, '
+                                 f'got {actual}')
+
+    @contextmanager
+    def open_stream(self, url, desc=None, keep=None, show_progress=True, sha256=None):
+        """
+        Open `url` as a readable file-like object for consumers that process the body as it arrives.
+        Progress is reported in bytes.  If `keep` is given a copy of the body is written to `<keep>.part` and
+        moved to `keep` once the whole body has been read and its length (and `sha256`, if given) verified.
+        Since the body has already been consumed a checksum mismatch is reported after the fact.
+        """
+        with self.app.http.get(url, stream=True) as response:
+            response.raise_for_status()
+            total_bytes = int(response.headers.get('Content-Length', 0)) or None
+            self.app.log.debug(f'Streaming {total_bytes} bytes from {url}')
+
+            copy_stream = open(f'{keep}.part', 'wb') if keep else None
+            try:
+                with self.rate_limit() as limiter, \
+                        TqdmProgressBar(unit='B', unit_scale=True, miniters=1, desc=desc or url, total=total_bytes,
+                                        disable=not show_progress) as progressbar:
+                    reader = ProgressReader(response.raw, progressbar, copy_stream, limiter)
+                    yield reader
+                    reader.drain()
+            finally:
+                if copy_stream:
+                    copy_stream.close()
+
+        error = None
+        if total_bytes is not None and reader.bytes_read != total_bytes:
+            error = f'Stream from {url} ended after {reader.bytes_read} of {total_bytes} bytes'
+        elif sha256 and reader.sha256.hexdigest() != sha256:
+            error = f'Checksum mismatch for {url}: expected sha256 {sha256}, got {reader.sha256.hexdigest()}'
+
+        if error:
+            if keep:
+                os.remove(f'{keep}.part')
+            raise HydraError(error)
+
+        if keep:
+            os.replace(f'{keep}.part', keep)
+
+    def _fetch_single(self, partial, progressbar, limiter=None):
+        with self.app.http.get(partial.url, stream=True) as request_stream, \
+                open(partial.part_path, 'wb') as file_stream:
+            request_stream.raise_for_status()
+            if partial.total_bytes:
+                preallocate(file_stream, partial.total_bytes)
+            copied = self._copyfileobj_progress(request_stream.raw, file_stream, progressbar, partial.digest,
+                                                limiter)
+            # Drop any preallocated space past a short body so verification sees the real length
+            file_stream.truncate(copied)
+
+    @staticmethod
+    def _copyfileobj_progress(source_stream, destination_stream, progressbar, digest=None, limiter=None):
+        """
+        copy data from file-like object source_stream to file-like object destination_stream
+        with progress bar updates throttled by time.  Returns the number of bytes copied.
+        """
+        progress = ThrottledProgress(progressbar.update, limiter=limiter)
+        try:
+            return copy_stream(source_stream, destination_stream, progress, digest)
+        finally:
+            progress.flush()
+
+    def _fetch_ranged(self, partial, progressbar, segmented, limiter=None, peers=None):
+        pieces = queue.Queue()
+        if partial.piece_hashes:
+            # Pieces must line up with the published hashes
+            for start, end in piece_ranges(partial.total_bytes, partial.piece_size):
+                if not partial.covers(start, end):
+                    pieces.put((start, end))
+        else:
+            # Without segmentation each missing range is fetched as a single request over one connection
+            for start, end in partial.missing:
+                for piece in piece_ranges(end - start, self.piece_size if segmented else end - start):
+                    pieces.put((start + piece[0], start + piece[1]))
+
+        if not partial.completed:
+            with open(partial.part_path, 'wb') as file_stream:
+                preallocate(file_stream, partial.total_bytes)
+
+        progress = ThrottledProgress(progressbar.update, limiter=limiter)
+        failed = threading.Event()
+
+        # Workers are spread over the origin and the peers
+        sources = [partial.url] + list(peers or [])
+        workers = max(1, min(max(self.connections, len(sources)) if segmented else 1, pieces.qsize()))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hydra-download') as executor:
+                futures = [executor.submit(self._segment_worker, partial, pieces, progress, failed,
+                                           sources[worker % len(sources)])
+                           for worker in range(workers)]
+                errors = [future.exception() for future in futures if future.exception()]
+        finally:
+            progress.flush()
+            partial.save()
+
+        if errors:
+            raise HydraError(f'Download of {partial.url} failed, rerun to resume: {errors[0]}')
+
+    def _segment_worker(self, partial, pieces, progress, failed, source):
+        # Each worker takes its own keep-alive connection from the shared pool and has its own file handle.
+        # Writes are unbuffered so pieces from concurrent workers never interleave inside a userspace buffer,
+        # and anything recorded in the sidecar has already been handed to the OS.
+        with open(partial.part_path, 'r+b', buffering=0) as file_stream:
+            while not failed.is_set():
+                try:
+                    start, end = pieces.get_nowait()
+                except queue.Empty:
+                    return
+
+                if partial.digest:
+                    # Keeps the out-of-order data held for hashing bounded
+                    partial.digest.wait_for(start, failed)
+                    if failed.is_set():
+                        return
+
+                try:
+                    self._fetch_piece(partial, file_stream, start, end, progress, source)
+                except Exception as exc:  # pylint: disable=broad-except
+                    if source == partial.url:
+                        failed.set()
+                        raise
+                    # The piece goes back to the queue and this worker carries on from the origin
+                    self.app.log.warning(f'Peer {source} failed for range {start}-{end - 1}: {exc}')
+                    pieces.put((start, end))
+                    source = partial.url
+
+    def _fetch_piece(self, partial, file_stream, start, end, progress, source=None):
+        source = source or partial.url
+        headers = {'Range': f'bytes={start}-{end - 1}'}
+        if partial.etag and source == partial.url:
+            headers['If-Range'] = partial.etag
+
+        with self.app.http.get(source, headers=headers, stream=True) as response:
+            if response.status_code != 206:
+                raise HydraError(f'Expected partial content for range {start}-{end - 1}, '
+                                 f'got HTTP {response.status_code}')
+
+            file_stream.seek(start)
+            if partial.piece_hashes:
+                self._fetch_verified_piece(partial, response, file_stream, start, end, progress)
+                return
+
+            position = start
+
+            def mark(num_bytes):
+                nonlocal position
+                partial.mark(position, position + num_bytes)
+                position += num_bytes
+                progress(num_bytes)
+
+            copy_stream(response.raw, file_stream, mark, partial.digest, offset=start, length=end - start)
+            if position < end:
+                raise HydraError(f'Connection closed at byte {position} of range {start}-{end - 1}')
+
+    @staticmethod
+    def _fetch_verified_piece(partial, response, file_stream, start, end, progress):
+        # Only recorded as complete once the whole piece matches its published hash
+        piece_digest = OrderedDigest(partial.part_path, start=start)
+        copied = copy_stream(response.raw, file_stream, progress, piece_digest, offset=start, length=end - start)
+        expected = partial.piece_hashes[start // partial.piece_size]
+        if copied < end - start or piece_digest.hexdigest() != expected:
+            progress.rewind(copied)
+            raise HydraError(f'Range {start}-{end - 1} failed verification')
+        partial.mark(start, end)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import HydraHelper
+
+
+class HttpHelper(HydraHelper):
+    """
+    Shared `requests.Session` for every HTTP call hydra makes.  Connections are kept alive in per-host pools,
+    idempotent requests are retried with exponential backoff, every request gets the configured timeouts, and
+    request counts and latency are recorded per host.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._metadata_lock = threading.Lock()
+        self._metadata = {}
+        self.stats = OrderedDict()
+
+    @property
+    def timeout(self):
+        return (float(self.config.get('http', 'connect_timeout')), float(self.config.get('http', 'read_timeout')))
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._build_session()
+            return self._session
+
+    def _build_session(self):
+        # Split jumpstarts run several segmented downloads at once
+        pool_size = max(int(self.config.get('http', 'pool_size')),
+                        self.app.download.connections * self.app.download.archive_workers)
+        retries = Retry(
+            total=int(self.config.get('http', 'retries')),
+            backoff_factor=float(self.config.get('http', 'backoff_factor')),
+            status_forcelist=self.RETRY_STATUSES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self._record(url, time.perf_counter() - started)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def get_metadata(self, url, strict=False):
+        """
+        GET a small published document (hydra.json, genesis.json, jumps.json, ...) and return its body.
+        Bodies are kept on disk with their ETag/Last-Modified and revalidated with a conditional GET, so an
+        unchanged document costs a 304.  Within one invocation each URL is only requested once.
+        Error responses are never cached; they are returned as-is, or raised with `strict`.
+        """
+        with self._metadata_lock:
+            if url in self._metadata:
+                return self._metadata[url]
+
+            cache_path = self.app.cache.path('http', hashlib.sha256(url.encode('utf-8')).hexdigest())
+            cached = self._read_metadata_cache(cache_path, url)
+
+            headers = {}
+            if cached and cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached and cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+            response = self.get(url, headers=headers)
+            if strict and response.status_code != 304:
+                response.raise_for_status()
+            if response.status_code == 304 and cached:
+                self.app.log.debug(f'Not modified: {url}')
+                content = cached['content']
+            else:
+                content = response.content
+                if response.status_code == 200:
+                    self._write_metadata_cache(cache_path, url, response)
+
+            if response.status_code in (200, 304):
+                self._metadata[url] = content
+            return content
+
+    @staticmethod
+    def _read_metadata_cache(cache_path, url):
+        try:
+            with open(f'{cache_path}.json', 'r') as meta_file:
+                meta = json.load(meta_file)
+            if meta['url'] != url:
+                return None
+            with open(cache_path, 'rb') as body_file:
+                meta['content'] = body_file.read()
+            return meta
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _write_metadata_cache(cache_path, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(f'{cache_path}.tmp', 'wb') as body_file:
+            body_file.write(response.content)
+        os.replace(f'{cache_path}.tmp', cache_path)
+        with open(f'{cache_path}.json.tmp', 'w') as meta_file:
+            json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, meta_file)
+        os.replace(f'{cache_path}.json.tmp', f'{cache_path}.json')
+
+    def _record(self, url, seconds):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._stats_lock:
+            host_stats = self.stats.setdefault(host, {'requests': 0, 'seconds': 0.0})
+            host_stats['requests'] += 1
+            host_stats['seconds'] += seconds
+
+    def log_stats(self):
+        # Latency is time to response headers; streamed bodies are not included
+        for host, host_stats in self.stats.items():
+            self.app.log.debug(f'HTTP {host}: {host_stats["requests"]} requests, '
+                               f'{host_stats["seconds"] / host_stats["requests"] * 1000:.1f}ms average latency')
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
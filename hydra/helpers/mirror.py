@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from hydra.core.exc import HydraError
+from . import HydraHelper
+
+
+class MirrorHelper(HydraHelper):
+    """
+    Access to the release channel, which `hydra.channel_url` may list as several mirrors (a list, or separated by
+    commas or whitespace), the first being the origin.  Mirrors are ranked by probing latency and throughput with a
+    small range request, the ranking is cached for `mirrors.ranking_ttl` seconds, and requests fail over to the
+    next mirror in the ranking.
+    """
+
+    # Mirrors are ranked by the estimated time to download this many bytes
+    RANK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._ranked = None
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self):
+        channel = self.config.get('hydra', 'channel_url')
+        if isinstance(channel, (list, tuple)):
+            urls = channel
+        else:
+            urls = re.split(r'[\s,]+', channel.strip())
+        return [url.rstrip('/') for url in urls if url]
+
+    @property
+    def origin(self):
+        return self.urls[0]
+
+    def ranked(self):
+        """The mirrors, fastest first"""
+        if self._ranked is not None:
+            return self._ranked
+
+        urls = self.urls
+        if len(urls) == 1:
+            self._ranked = urls
+            return self._ranked
+
+        ranking_path = self.app.cache.path('mirrors.json')
+        try:
+            with open(ranking_path, 'r') as ranking_file:
+                ranking = json.load(ranking_file)
+            if (sorted(ranking['ranked']) == sorted(urls) and
+                    time.time() - ranking['probed_at'] < float(self.config.get('mirrors', 'ranking_ttl'))):
+                self._ranked = ranking['ranked']
+                return self._ranked
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix='hydra-probe') as executor:
+            scores = dict(zip(urls, executor.map(self._probe, urls)))
+        self._ranked = sorted(urls, key=lambda url: (scores[url], urls.index(url)))
+        self.app.log.debug(f'Mirror ranking: {", ".join(self._ranked)}')
+        self._save_ranking()
+        return self._ranked
+
+    def _probe(self, mirror):
+        """Estimated seconds to download RANK_SIZE bytes from `mirror`, or infinity if it can't be reached"""
+        probe_bytes = int(self.config.get('mirrors', 'probe_bytes'))
+        url = f'{mirror}/{self.config.get("mirrors", "probe_path")}'
+        try:
+            started = time.perf_counter()
+            with self.app.http.get(url, headers={'Range': f'bytes=0-{probe_bytes - 1}'}, stream=True,
+                                   timeout=(2, 5)) as response:
+                latency = time.perf_counter() - started
+                response.raise_for_status()
+                received = len(response.raw.read(probe_bytes))
+            transfer = max(time.perf_counter() - started - latency, 1e-6)
+        except requests.RequestException as exc:
+            self.app.log.debug(f'Mirror {mirror} probe failed: {exc}')
+            return float('inf')
+
+        score = latency + (self.RANK_SIZE * transfer / received if received else latency * 100)
+        self.app.log.debug(f'Mirror {mirror}: {latency * 1000:.0f}ms latency, '
+                           f'{received / transfer / 1024 / 1024:.1f}MB/s')
+        return score
+
+    def demote(self, mirror):
+        """Move a mirror that failed to the end of the ranking"""
+        ranked = self.ranked()
+        with self._lock:
+            if mirror in self._ranked and len(ranked) > 1:
+                self._ranked = [url for url in self._ranked if url != mirror] + [mirror]
+                self._save_ranking()
+
+    def _save_ranking(self):
+        ranking_path = self.app.cache.path('mirrors.json')
+        os.makedirs(os.path.dirname(ranking_path), exist_ok=True)
+        with open(f'{ranking_path}.tmp', 'w+') as ranking_file:
+            json.dump({'ranked': self._ranked, 'probed_at': time.time()}, ranking_file)
+        os.replace(f'{ranking_path}.tmp', ranking_path)
+
+    def url(self, path):
+        """URL of `path` on the fastest mirror"""
+        return f'{self.ranked()[0]}/{path}'
+
+    def get_metadata(self, path):
+        """`HttpHelper.get_metadata` for a channel path, from the first mirror that serves it"""
+        ranked = self.ranked()
+        for mirror in ranked[:-1]:
+            try:
+                return self.app.http.get_metadata(f'{mirror}/{path}', strict=True)
+            except requests.RequestException as exc:
+                self.app.log.warning(f'Mirror {mirror} failed for {path}, trying the next one: {exc}')
+                self.demote(mirror)
+        return self.app.http.get_metadata(f'{ranked[-1]}/{path}')
+
+    def fetch(self, destination, path, sha256=None, size=None, **kwargs):
+        """
+        Download a channel path with `DownloadHelper.fetch`, failing over to the next mirror if one fails.  When
+        `sha256` is known a download interrupted on one mirror is resumed from the next.
+        """
+        errors = []
+        for mirror in list(self.ranked()):
+            try:
+                self.app.download.fetch(destination, f'{mirror}/{path}', sha256=sha256, size=size, **kwargs)
+                return
+            except (HydraError, requests.RequestException) as exc:
+                self.app.log.warning(f'Download of {path} from {mirror} failed: {exc}')
+                errors.append(exc)
+                self.demote(mirror)
+        raise HydraError(f'Unable to download {path} from any mirror: {errors[-1]}')
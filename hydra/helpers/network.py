@@ -1,6 +1,16 @@
+import codecs
+import itertools
 import json
 import os
+import random
+import select
+import threading
+import time
+import uuid
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 import boto3
 import paramiko
@@ -10,10 +20,123 @@ from troposphere import ec2, iam, route53, elasticloadbalancingv2 as elb
 
 import yaml
 
+from hydra.core.exc import HydraError
 from . import HydraHelper
 
 
+class RemoteOutput:
+    """
+    The stdout of a command run over SSH, read while the command runs.  Reaching the end of the output raises
+    HydraError if the command failed, so a consumer can't mistake the output of a failed command for complete.
+    """
+
+    def __init__(self, cmd, stdout, stderr):
+        self.cmd = cmd
+        self._stdout = stdout
+        self._stderr = []
+        # stderr is drained as it arrives so a chatty command can't stall on a full SSH window
+        self._stderr_reader = threading.Thread(target=lambda: self._stderr.extend(stderr), daemon=True)
+        self._stderr_reader.start()
+
+    def read(self, size=-1):
+        data = self._stdout.read(size)
+        if not data and size:
+            status = self._stdout.channel.recv_exit_status()
+            if status:
+                self._stderr_reader.join()
+                raise HydraError(f'`{self.cmd}` exited with status {status}: {"".join(self._stderr).strip()}')
+        return data
+
+
+class RemoteLines:
+    """
+    The output of a command run over SSH as lines, stdout and stderr interleaved in the order they arrive.  Only
+    the current line of each stream is held, and a line longer than `max_line` characters is yielded in pieces, so
+    memory stays bounded however much the command prints.  The last `tail_lines` lines are kept in `tail` for
+    error reports, and `status` is set once the command exits.  A failed command is logged with its tail.
+    """
+
+    def __init__(self, cmd, chunks, log, tail_lines, max_line):
+        self.cmd = cmd
+        self.status = None
+        self.tail = deque(maxlen=tail_lines)
+        self._chunks = chunks
+        self._log = log
+        self._max_line = max_line
+
+    def __iter__(self):
+        decoders = {name: codecs.getincrementaldecoder('utf-8')('replace') for name in ('stdout', 'stderr')}
+        pending = {name: '' for name in decoders}
+
+        for name, data in self._chunks:
+            if name == 'status':
+                self.status = data
+                continue
+            *lines, pending[name] = (pending[name] + decoders[name].decode(data)).split('\n')
+            while len(pending[name]) > self._max_line:
+                lines.append(pending[name][:self._max_line])
+                pending[name] = pending[name][self._max_line:]
+            for line in lines:
+                self.tail.append(line)
+                yield line
+
+        for name in pending:
+            line = pending[name] + decoders[name].decode(b'', final=True)
+            if line:
+                self.tail.append(line)
+                yield line
+
+        if self.status != 0:
+            tail = '\n'.join(self.tail)
+            self._log.error(f'`{self.cmd}` exited with status {self.status}, last output:\n{tail}')
+
+
+class ScriptSteps:
+    """
+    Parses the output of a script rendered by `NetworkHelper.render_script` as it arrives, recording the output
+    and exit status of each step when its marker line is read and passing the step to `on_step`.
+    """
+
+    def __init__(self, marker, commands, on_step=None):
+        self.marker = marker
+        self.commands = commands
+        self.on_step = on_step
+        self.steps = []
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._pending = ''
+        self._output = []
+
+    def feed(self, data):
+        *lines, self._pending = (self._pending + self._decoder.decode(data)).split('\n')
+        for line in lines:
+            if line.startswith(f'{self.marker} '):
+                self._finish_step(int(line.split()[-1]))
+            else:
+                self._output.append(line)
+
+    def _finish_step(self, status):
+        # The marker's leading newline ends the step's last line, so joining the lines restores its output
+        output = '\n'.join(self._output)
+        step = {'cmd': self.commands[len(self.steps)], 'status': status, 'output': output}
+        self.steps.append(step)
+        self._output = []
+        if self.on_step:
+            self.on_step(step)
+
+
 class NetworkHelper(HydraHelper):
+    SSH_USER = 'ubuntu'
+    SSH_KEEPALIVE = 30
+    SSH_READ_SIZE = 32 * 1024
+    SSH_TAIL_LINES = 100
+    SSH_MAX_LINE = 64 * 1024
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._ssh_clients = {}
+        self._ssh_connect_locks = {}
+        self._ssh_lock = threading.Lock()
+
     def default_features_list(self):
         return [
             'addrmapper:v1.1',
@@ -82,61 +205,282 @@ class NetworkHelper(HydraHelper):
 
         json.dump(networks, open(self.app.utils.path('networks.json'), 'w+'))
 
-    def run_command(self, ip, cmd):
+    @property
+    def ssh_key(self):
         default_key = '~/.ssh/%(aws_ec2_key_name)s.pem'
         provision = self.app.config['provision']
-        key = os.path.expanduser(
+        return os.path.expanduser(
             'aws_ec2_key_path' in provision and
             provision['aws_ec2_key_path'] % provision or
             default_key % provision
         )
 
+    def _ssh_client(self, ip, reconnect=False):
+        """
+        The pooled SSH client for `ip`, connecting on first use.  Clients are keyed by (ip, user, key) and kept for
+        the life of the process; each command opens its own channel on the client's transport, so one handshake
+        per host is shared by every command.  A client whose transport has dropped is replaced.
+        """
+        key = self.ssh_key
+        pool_key = (ip, self.SSH_USER, key)
+        with self._ssh_lock:
+            client = self._ssh_clients.get(pool_key)
+            connect_lock = self._ssh_connect_locks.setdefault(pool_key, threading.Lock())
+
+        if client is not None and not reconnect and self._ssh_alive(client):
+            return client
+
+        # Connecting is serialised per host, so threads working on different hosts handshake concurrently
+        with connect_lock:
+            with self._ssh_lock:
+                current = self._ssh_clients.get(pool_key)
+            if current is not None and current is not client and self._ssh_alive(current):
+                return current
+            if current is not None:
+                current.close()
+
+            self.app.log.debug(f'Connecting to {ip} using keyfile: {key}')
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.client.AutoAddPolicy)
+
+                client.connect(ip, username=self.SSH_USER, key_filename=key)
+            client.get_transport().set_keepalive(self.SSH_KEEPALIVE)
+
+            with self._ssh_lock:
+                self._ssh_clients[pool_key] = client
+            return client
+
+    @staticmethod
+    def _ssh_alive(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _ssh_open(self, ip, open_channel):
+        """Call `open_channel` with the pooled client for `ip`, reconnecting once if the transport went away"""
+        try:
+            return open_channel(self._ssh_client(ip))
+        except (paramiko.SSHException, EOFError, OSError) as exc:
+            self.app.log.debug(f'SSH connection to {ip} lost ({exc}), reconnecting')
+            return open_channel(self._ssh_client(ip, reconnect=True))
+
+    def _channel_chunks(self, ip, cmd, timeout=None, stdin=None):
+        """
+        Run `cmd` on `ip`, yielding `('stdout', data)` and `('stderr', data)` chunks as they arrive and finally
+        `('status', exit status)`.  The status is None if the command ran for longer than `timeout` seconds.
+        Nothing is read ahead of the consumer, so a slow consumer holds the command back instead of buffering.
+        """
+        started = time.monotonic()
+        status = None
+
+        channel = self._ssh_open(ip, lambda client: client.get_transport().open_session())
+        try:
+            channel.exec_command(cmd)
+            if stdin is not None:
+                channel.sendall(stdin.encode('utf-8'))
+                channel.shutdown_write()
+            while True:
+                # Both streams are drained as data arrives so neither can stall the command on a full SSH window
+                while channel.recv_ready():
+                    yield 'stdout', channel.recv(self.SSH_READ_SIZE)
+                while channel.recv_stderr_ready():
+                    yield 'stderr', channel.recv_stderr(self.SSH_READ_SIZE)
+                if channel.exit_status_ready() or channel.closed:
+                    if not channel.recv_ready() and not channel.recv_stderr_ready():
+                        status = channel.recv_exit_status() if channel.exit_status_ready() else None
+                        break
+                    continue
+
+                remaining = timeout - (time.monotonic() - started) if timeout else 1
+                if remaining <= 0:
+                    self.app.log.warning(f'Timed out after {timeout}s on {ip}: {cmd}')
+                    break
+                select.select([channel], [], [], min(remaining, 1))
+        finally:
+            channel.close()
+
+        yield 'status', status
+
+    def execute(self, ip, cmd, timeout=None, stdin=None, on_stdout=None):
+        """
+        Run `cmd` on `ip` and return a dict of its exit `status`, `stdout`, `stderr` and the `seconds` it took.
+        A command still running after `timeout` seconds has its channel closed and a `status` of None.  `stdin`
+        (a string) is sent to the command, and `on_stdout` is called with each chunk of stdout as it arrives.
+        """
         self.app.log.info(f'Running on {ip}: {cmd}')
-        self.app.log.debug(f'Using keyfile: {key}')
-
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.client.AutoAddPolicy)
-
-            client.connect(ip, username='ubuntu', key_filename=key)
-
-            _, stdout, stderr = client.exec_command(cmd)
-            output = ''.join(line for line in stdout)
-            error = ''.join(line for line in stderr)
-
-            client.close()
+        started = time.monotonic()
+        output = {'stdout': [], 'stderr': []}
+        status = None
+
+        for name, data in self._channel_chunks(ip, cmd, timeout=timeout, stdin=stdin):
+            if name == 'status':
+                status = data
+                continue
+            output[name].append(data)
+            if name == 'stdout' and on_stdout:
+                on_stdout(data)
+
+        return {
+            'status': status,
+            'stdout': b''.join(output['stdout']).decode('utf-8', 'replace'),
+            'stderr': b''.join(output['stderr']).decode('utf-8', 'replace'),
+            'seconds': round(time.monotonic() - started, 2),
+        }
 
-            self.app.log.debug(f'Output: {output}')
-            if error:
-                self.app.log.error(f'Error: {error}')
-            return output
+    def run_command(self, ip, cmd, stream=False, timeout=None):
+        """
+        Run `cmd` on `ip` and return its stdout.  With `stream`, return a RemoteLines instead, to iterate over the
+        output as the command runs without holding all of it.
+        """
+        if stream:
+            self.app.log.info(f'Running on {ip}: {cmd}')
+            return RemoteLines(cmd, self._channel_chunks(ip, cmd, timeout=timeout), self.app.log,
+                               self.SSH_TAIL_LINES, self.SSH_MAX_LINE)
+
+        result = self.execute(ip, cmd, timeout=timeout)
+
+        self.app.log.debug(f'Output: {result["stdout"]}')
+        if result['stderr']:
+            self.app.log.error(f'Error: {result["stderr"]}')
+        return result['stdout']
+
+    def log_command(self, ip, cmd, timeout=None):
+        """Run `cmd` on `ip`, logging its output line by line as it runs; returns the exit status"""
+        lines = self.run_command(ip, cmd, stream=True, timeout=timeout)
+        for line in lines:
+            self.app.log.info(f'{ip}: {line}')
+        return lines.status
+
+    @staticmethod
+    def render_script(commands, directory=None):
+        """
+        Render `commands` into one bash script.  Each command runs in its own subshell with stderr merged into
+        stdout, followed by a marker line with its exit status; a failed command doesn't stop the ones after it.
+        Commands read stdin from /dev/null, as the script itself arrives on bash's stdin.
+        Returns the script and its marker.
+        """
+        marker = f'__hydra_step_{uuid.uuid4().hex}__'
+        lines = []
+        if directory:
+            lines.append(f'cd {directory} || exit 1')
+        for number, command in enumerate(commands):
+            lines.append(f"( {command}\n) < /dev/null 2>&1; printf '\\n%s %d %d\\n' {marker} {number} $?")
+        return '\n'.join(lines) + '\n', marker
+
+    def run_script(self, ip, commands, directory=None, timeout=None):
+        """
+        Run `commands` on `ip` in order as one script over a single channel, instead of a round trip per command.
+        Each step is logged as it finishes; the result is `execute`'s, with the `steps` that ran and a `status`
+        that is the first failed step's, if any, or None if not every step ran.
+        """
+        script, marker = self.render_script(commands, directory)
+
+        def log_step(step):
+            self.app.log.info(f'Step on {ip} exited {step["status"]}: {step["cmd"]}')
+            self.app.log.debug(f'Output: {step["output"]}')
+            if step['status']:
+                self.app.log.error(f'Error: {step["output"]}')
+
+        steps = ScriptSteps(marker, commands, on_step=log_step)
+        result = self.execute(ip, 'bash -s', timeout=timeout, stdin=script, on_stdout=steps.feed)
+        result['steps'] = steps.steps
+        if len(steps.steps) < len(commands):
+            # The script stopped early: it couldn't change directory, timed out or lost its connection
+            result['status'] = None
+        else:
+            result['status'] = next((step['status'] for step in steps.steps if step['status']), 0)
+        return result
+
+    def _fan_out(self, ips, run, workers, on_result=None):
+        def run_safely(ip):
+            try:
+                return run(ip)
+            except Exception as exc:  # pylint: disable=broad-except
+                return {'status': None, 'stdout': '', 'stderr': f'{type(exc).__name__}: {exc}', 'seconds': None}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ips))),
+                                thread_name_prefix='hydra-ssh') as executor:
+            futures = {executor.submit(run_safely, ip): ip for ip in ips}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if on_result:
+                    on_result(futures[future], results[futures[future]])
+        return {ip: results[ip] for ip in ips}
+
+    def run_on_nodes(self, ips, cmd, workers, timeout=None, on_result=None):
+        """
+        Run `cmd` on every ip in `ips`, at most `workers` at a time, and return their `execute` results by ip in
+        the order of `ips`.  `on_result(ip, result)` is called as each node finishes.  A node that can't be
+        reached gets a `status` of None and the error as its `stderr`.
+        """
+        return self._fan_out(ips, lambda ip: self.execute(ip, cmd, timeout=timeout), workers, on_result)
+
+    def run_scripts(self, scripts, workers, directory=None, timeout=None):
+        """`run_script` on several nodes at once; `scripts` maps each ip to its commands"""
+        return self._fan_out(list(scripts), lambda ip: self.run_script(ip, scripts[ip], directory, timeout),
+                             workers)
+
+    def wait_for_nodes(self, ips, check, timeout, on_ready=None, base_delay=5, max_delay=60):
+        """
+        Call `check(ip)` on every node concurrently until it returns without raising, and return the values by ip.
+        Each node retries with exponential backoff and full jitter, between `base_delay` and `max_delay` seconds,
+        so nodes booting together don't poll in lockstep; all of them share one deadline `timeout` seconds away.
+        `on_ready(ip, value)` is called as each node becomes ready.  Nodes not ready by the deadline are left out.
+        """
+        deadline = time.monotonic() + timeout
+
+        def poll(ip):
+            for attempt in itertools.count():
+                try:
+                    return check(ip)
+                except Exception as exc:  # pylint: disable=broad-except
+                    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.app.log.error(f'Timed out waiting for node {ip}: {exc}')
+                        raise
+                    self.app.log.debug(f'Node {ip} not ready on attempt {attempt + 1} ({exc}), retrying')
+                    time.sleep(min(delay, remaining))
+
+        ready = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(ips)), thread_name_prefix='hydra-poll') as executor:
+            futures = {executor.submit(poll, ip): ip for ip in ips}
+            for future in as_completed(futures):
+                if future.exception() is None:
+                    ready[futures[future]] = future.result()
+                    if on_ready:
+                        on_ready(futures[future], ready[futures[future]])
+        return {ip: ready[ip] for ip in ips if ip in ready}
+
+    @contextmanager
+    def stream_command(self, ip, cmd):
+        """Run `cmd` on `ip`, yielding a RemoteOutput to read its output from while it runs"""
+        self.app.log.info(f'Streaming from {ip}: {cmd}')
+
+        _, stdout, stderr = self._ssh_open(ip, lambda client: client.exec_command(cmd))
+        try:
+            yield RemoteOutput(cmd, stdout, stderr)
+        finally:
+            stdout.channel.close()
 
     def scp(self, ip, file, dest):
-        default_key = '~/.ssh/%(aws_ec2_key_name)s.pem'
-        provision = self.app.config['provision']
-        key = os.path.expanduser(
-            'aws_ec2_key_path' in provision and
-            provision['aws_ec2_key_path'] % provision or
-            default_key % provision
-        )
-
         self.app.log.info(f'Copying to {ip}: {file}')
-        self.app.log.debug(f'Using keyfile: {key}')
-
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
 
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.client.AutoAddPolicy)
-
-            client.connect(ip, username='ubuntu', key_filename=key)
-
-            ftp_client = client.open_sftp()
+        ftp_client = self._ssh_open(ip, lambda client: client.open_sftp())
+        try:
             ftp_client.put(file, dest)
+        finally:
             ftp_client.close()
 
+    def close(self):
+        """Close every pooled SSH connection"""
+        with self._ssh_lock:
+            clients = list(self._ssh_clients.values())
+            self._ssh_clients.clear()
+        for client in clients:
             client.close()
 
     def bootstrap_config(self, network_name):
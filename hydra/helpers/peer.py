@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .cache import file_sha256
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTPServer handling each request in its own thread; http.server only has one from Python 3.7"""
+    daemon_threads = True
+
+
+def verified_archives(store, archives, log):
+    """
+    Return {file name: path} for the archives in the `store` directory whose sha256 matches the published
+    `archives` metadata of jumps.json.  Results are remembered in `<store>/.verified.json` by size and mtime so
+    archives are only hashed once.
+    """
+    verified_path = os.path.join(store, '.verified.json')
+    try:
+        with open(verified_path, 'r') as verified_file:
+            verified = json.load(verified_file)
+    except (OSError, ValueError):
+        verified = {}
+
+    served = {}
+    for file_name in sorted(os.listdir(store)) if os.path.isdir(store) else []:
+        sha256 = archives.get(file_name, {}).get('sha256')
+        if not sha256:
+            continue
+
+        path = os.path.join(store, file_name)
+        stat = os.stat(path)
+        known = verified.get(file_name)
+        if not known or known['size'] != stat.st_size or known['mtime'] != stat.st_mtime:
+            log.info(f'Verifying {file_name}')
+            known = verified[file_name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': file_sha256(path)}
+
+        if known['sha256'] == sha256:
+            served[file_name] = path
+        else:
+            log.warning(f'{file_name} does not match its published checksum, not serving it')
+
+    with open(f'{verified_path}.tmp', 'w+') as verified_file:
+        json.dump(verified, verified_file)
+    os.replace(f'{verified_path}.tmp', verified_path)
+    return served
+
+
+class JumpstartRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the files in `files` ({URL path: file path}) with single `Range: bytes=start-end` support.  The body is
+    sent with sendfile, so serving peers costs little CPU on the validator.
+    """
+    files = {}
+    log = None
+    server_version = 'hydra-jumpstart'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.log:
+            self.log.debug(f'{self.address_string()} {format % args}')
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.serve(send_body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.serve()
+
+    def serve(self, send_body=True):
+        path = self.files.get(urllib.parse.unquote(urllib.parse.urlsplit(self.path).path))
+        if not path:
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end, status = 0, size - 1, 200
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = re.match(r'bytes=(\d+)-(\d*)$', range_header)
+            if not match or int(match.group(1)) >= size or \
+                    (match.group(2) and int(match.group(2)) < int(match.group(1))):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.end_headers()
+                return
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if send_body:
+            try:
+                with open(path, 'rb') as archive_file:
+                    self.connection.sendfile(archive_file, offset=start, count=end - start + 1)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+def serve_files(files, bind, port, log):
+    """Serve `files` ({URL path: file path}) until interrupted"""
+    handler = type('JumpstartHandler', (JumpstartRequestHandler,), {'files': files, 'log': log})
+    server = ThreadingHTTPServer((bind, port), handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
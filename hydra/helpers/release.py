@@ -1,8 +1,17 @@
+import json
 import os
+import shutil
 
 import boto3
 
-from . import HydraHelper
+from . import HydraHelper, TqdmProgressBar
+from .cache import file_sha256
+from .upload import multipart_upload
+
+try:
+    import bsdiff4
+except ImportError:  # pragma: nocover
+    bsdiff4 = None
 
 
 class ReleaseHelper(HydraHelper):
@@ -26,6 +35,26 @@ class ReleaseHelper(HydraHelper):
     def dist_bucket(self):
         return self.config.get('release', 'aws_s3_dist_bucket') % self.config['hydra']
 
+    @property
+    def s3_endpoint_url(self):
+        # Set to use another S3 compatible store, e.g. minio
+        return self.config.get('release', 's3_endpoint_url') or None
+
+    def s3_resource(self):
+        return self.get_boto().resource('s3', endpoint_url=self.s3_endpoint_url)
+
+    def upload_stream(self, key, source, digest=None, **create_args):
+        """
+        Stream `source` to `key` in the dist bucket as a multipart upload of `release.upload_part_size` parts,
+        `release.upload_workers` at a time (see `multipart_upload`)
+        """
+        client = self.get_boto().client('s3', endpoint_url=self.s3_endpoint_url)
+        with TqdmProgressBar(unit='B', unit_scale=True, miniters=1, desc=os.path.basename(key)) as progressbar:
+            return multipart_upload(client, self.dist_bucket, key, source,
+                                    part_size=int(self.config.get('release', 'upload_part_size')),
+                                    workers=max(1, int(self.config.get('release', 'upload_workers'))),
+                                    digest=digest, progress=progressbar.update, **create_args)
+
     def dist_exec(self, *args):
         return self.app.utils.binary_exec(self.dist_binary_path, *args)
 
@@ -37,3 +66,56 @@ class ReleaseHelper(HydraHelper):
 
     def get_boto(self):
         return boto3.Session(profile_name=self.config.get('release', 'aws_profile'))
+
+    def release_history(self):
+        """Versions published by `upload-dist`, oldest first"""
+        try:
+            return json.loads(self.app.mirrors.get_metadata('releases.json')).get('releases', [])
+        except Exception as exc:  # pylint: disable=broad-except
+            self.app.log.debug(f'Unable to retrieve release history: {exc}')
+            return []
+
+    def make_patches(self, build):
+        """
+        Write bsdiff patches from the binaries of the previous `release.patch_versions` releases to the dist binary
+        into `<distdir>/patches`.  Returns the manifest entries for the patches, keyed by the version they apply to.
+        """
+        patches_dir = self.path('patches')
+        shutil.rmtree(patches_dir, ignore_errors=True)
+
+        if not bsdiff4:
+            self.app.log.warning('bsdiff4 is not installed, releasing without binary patches')
+            return {}
+
+        previous = [version for version in self.release_history() if version != build]
+        previous = previous[-int(self.config.get('release', 'patch_versions')):] if previous else []
+
+        os.makedirs(patches_dir, exist_ok=True)
+        binary_size = os.path.getsize(self.dist_binary_path)
+        patches = {}
+        for version in previous:
+            old_binary = os.path.join(patches_dir, 'previous')
+            try:
+                self.app.utils.download_release_file(old_binary, 'shipchain', version)
+            except Exception as exc:  # pylint: disable=broad-except
+                self.app.log.warning(f'Unable to retrieve shipchain {version}, skipping its patch: {exc}')
+                continue
+
+            from_sha256 = file_sha256(old_binary)
+            patch_file = f'shipchain-{from_sha256[:16]}.bsdiff'
+            self.app.log.info(f'Making patch from {version}')
+            bsdiff4.file_diff(old_binary, self.dist_binary_path, os.path.join(patches_dir, patch_file))
+            os.remove(old_binary)
+
+            patch_path = os.path.join(patches_dir, patch_file)
+            if os.path.getsize(patch_path) >= binary_size:
+                os.remove(patch_path)
+                continue
+
+            patches[version] = {
+                'file': f'./patches/{patch_file}',
+                'from_sha256': from_sha256,
+                'size': os.path.getsize(patch_path),
+                'sha256': file_sha256(patch_path),
+            }
+        return patches
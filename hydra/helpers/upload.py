@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StreamDigest:
+    """The size, sha256 and sha256 of each `piece_size` piece of a stream, updated as the stream is read"""
+
+    def __init__(self, piece_size):
+        self.piece_size = piece_size
+        self.size = 0
+        self.piece_hashes = []
+        self._sha256 = hashlib.sha256()
+        self._piece = hashlib.sha256()
+        self._piece_bytes = 0
+
+    def update(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.piece_size - self._piece_bytes)
+            self._piece.update(view[:take])
+            self._piece_bytes += take
+            view = view[take:]
+            if self._piece_bytes == self.piece_size:
+                self._finish_piece()
+
+    def _finish_piece(self):
+        self.piece_hashes.append(self._piece.hexdigest())
+        self._piece = hashlib.sha256()
+        self._piece_bytes = 0
+
+    def hexdigest(self):
+        """The sha256 of the whole stream, closing the last piece; call once the stream is exhausted"""
+        if self._piece_bytes:
+            self._finish_piece()
+        return self._sha256.hexdigest()
+
+
+def read_part(source, size):
+    """Read `size` bytes from `source`, or fewer at the end of the stream; pipes may return short reads"""
+    chunks, remaining = [], size
+    while remaining:
+        chunk = source.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def multipart_upload(client, bucket, key, source, part_size, workers, digest=None, progress=None, **create_args):
+    """
+    Stream `source` (a readable file-like object) to s3://bucket/key with a multipart upload.  Parts of `part_size`
+    bytes are uploaded by `workers` threads, and reading waits while `workers` parts are in flight, so no more
+    than `workers + 1` parts are held in memory.  `digest` (a StreamDigest) is updated and `progress` called with
+    the length of each part as it is read.  The object only appears once every part is uploaded; on any error,
+    including one raised by `source`, the upload is aborted.  Returns the number of bytes uploaded.
+    """
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **create_args)['UploadId']
+    slots = threading.BoundedSemaphore(workers)
+    failed = []
+
+    def upload_part(part_number, data):
+        try:
+            response = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                          Body=data)
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        except Exception as exc:
+            failed.append(exc)
+            raise
+        finally:
+            slots.release()
+
+    try:
+        size = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hydra-upload') as executor:
+            futures = []
+            while not failed:
+                data = read_part(source, part_size)
+                # S3 needs at least one part, even for an empty object
+                if not data and futures:
+                    break
+                if digest:
+                    digest.update(data)
+                if progress:
+                    progress(len(data))
+                size += len(data)
+
+                slots.acquire()
+                futures.append(executor.submit(upload_part, len(futures) + 1, data))
+                if len(data) < part_size:
+                    break
+            parts = [future.result() for future in futures]
+
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={'Parts': parts})
+        return size
+    except BaseException:
+        client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
@@ -11,14 +11,19 @@ from .controllers.devel import Devel
 from .controllers.network import Network
 from .core.exc import HydraError
 from .helpers import UtilsHelper, inject_jinja_globals
+from .helpers.cache import CacheHelper
 from .helpers.client import ClientHelper
 from .helpers.devel import DevelHelper
+from .helpers.download import DownloadHelper
+from .helpers.http import HttpHelper
+from .helpers.mirror import MirrorHelper
 from .helpers.network import NetworkHelper
 from .helpers.release import ReleaseHelper
 
 # configuration defaults
 CONFIG = init_defaults('hydra', 'log.logging', 'release',
-                       'devel', 'provision', 'client', 'loom')
+                       'devel', 'provision', 'client', 'loom', 'download',
+                       'cache', 'http', 'mirrors')
 CONFIG['hydra']['workdir'] = os.path.realpath(os.getcwd())
 CONFIG['hydra']['project'] = 'shipchain'
 CONFIG['hydra']['binary_name'] = '%(project)s'
@@ -30,6 +35,10 @@ CONFIG['release']['distdir'] = './dist'
 CONFIG['release']['build_binary_path'] = './loomchain/shipchain'
 CONFIG['release']['aws_profile'] = None
 CONFIG['release']['aws_s3_dist_bucket'] = 'shipchain-network-dist'
+CONFIG['release']['patch_versions'] = 3
+CONFIG['release']['s3_endpoint_url'] = None
+CONFIG['release']['upload_part_size'] = 64 * 1024 * 1024
+CONFIG['release']['upload_workers'] = 4
 CONFIG['provision']['aws_profile'] = None
 CONFIG['provision']['aws_ec2_region'] = 'us-east-1'
 CONFIG['provision']['aws_ec2_instance_type'] = 'm5.xlarge'
@@ -56,12 +65,33 @@ CONFIG['provision']['dpos'] = {
     'referral_fee': 300
 }
 CONFIG['provision']['chain_id'] = 'default'
+CONFIG['provision']['ssh_workers'] = 10
+CONFIG['provision']['bootstrap_timeout'] = 30 * 60
 CONFIG['loom']['loom_log_name'] = 'loom.log'
 CONFIG['loom']['loom_log_level'] = 'debug'
 CONFIG['loom']['contract_log_level'] = 'debug'
 CONFIG['loom']['blockchain_log_level'] = 'error'
 CONFIG['devel']['path'] = '%(workdir)s/devel'
 CONFIG['client']['pip_install'] = 'shipchain-hydra'
+CONFIG['client']['jumpstart_port'] = 46680
+CONFIG['download']['connections'] = 8
+CONFIG['download']['piece_size'] = 16 * 1024 * 1024
+CONFIG['download']['min_segmented_size'] = 64 * 1024 * 1024
+CONFIG['download']['archive_workers'] = 4
+CONFIG['download']['rate_limit'] = 0
+CONFIG['download']['adaptive_rate'] = False
+CONFIG['download']['min_rate'] = '256K'
+CONFIG['download']['node_status_url'] = 'http://localhost:46657/status'
+CONFIG['cache']['path'] = '~/.hydra/cache'
+CONFIG['cache']['max_size'] = 2 * 1024 * 1024 * 1024
+CONFIG['http']['connect_timeout'] = 10
+CONFIG['http']['read_timeout'] = 60
+CONFIG['http']['retries'] = 5
+CONFIG['http']['backoff_factor'] = 0.5
+CONFIG['http']['pool_size'] = 16
+CONFIG['mirrors']['probe_path'] = 'latest/shipchain'
+CONFIG['mirrors']['probe_bytes'] = 256 * 1024
+CONFIG['mirrors']['ranking_ttl'] = 6 * 60 * 60
 
 META = init_defaults('output.json')
 META['output.json']['overridable'] = True
@@ -69,6 +99,10 @@ META['output.json']['overridable'] = True
 
 def add_helpers(app):
     UtilsHelper.attach('utils', app)
+    HttpHelper.attach('http', app)
+    MirrorHelper.attach('mirrors', app)
+    DownloadHelper.attach('download', app)
+    CacheHelper.attach('cache', app)
     ReleaseHelper.attach('release', app)
     DevelHelper.attach('devel', app)
     ClientHelper.attach('client', app)
@@ -76,6 +110,17 @@ def add_helpers(app):
     app.project = app.config.get('hydra', 'project')
 
 
+def close_http(app):
+    if hasattr(app, 'http'):
+        app.http.log_stats()
+        app.http.close()
+
+
+def close_ssh(app):
+    if hasattr(app, 'network'):
+        app.network.close()
+
+
 def disable_logs_json_handler(app):
     if app.output.Meta.label == 'json':
         app.log.backend.level = 40
@@ -131,7 +176,9 @@ class Hydra(App):
 
         hooks = [
             ('post_setup', add_helpers),
-            ('post_argument_parsing', disable_logs_json_handler)
+            ('post_argument_parsing', disable_logs_json_handler),
+            ('pre_close', close_http),
+            ('pre_close', close_ssh)
         ]
 
 
@@ -2,9 +2,17 @@
 PyTest Fixtures.
 """
 
+import os
+import re
+import threading
+import urllib.parse
+from http.server import SimpleHTTPRequestHandler
+
 import pytest
 from cement import fs
 
+from hydra.helpers.peer import ThreadingHTTPServer
+
 @pytest.fixture(scope="function")
 def tmp(request):
     """
@@ -14,3 +22,69 @@ def tmp(request):
     t = fs.Tmp()
     yield t
     t.remove()
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler serving `root` with support for single `Range: bytes=start-end` requests"""
+    accept_ranges = True
+    root = None
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def translate_path(self, path):
+        # The `directory` argument of SimpleHTTPRequestHandler needs Python 3.7
+        path = urllib.parse.unquote(urllib.parse.urlsplit(path).path)
+        return os.path.join(self.root, *[part for part in path.split('/') if part not in ('', '.', '..')])
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if not self.accept_ranges or not match or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+
+        source = open(path, 'rb')
+        source.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.range_remaining = end - start + 1
+        return source
+
+    def end_headers(self):
+        if self.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, 'range_remaining', None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            buf = source.read(min(64 * 1024, remaining))
+            if not buf:
+                break
+            outputfile.write(buf)
+            remaining -= len(buf)
+        return None
+
+
+@pytest.fixture(scope="function")
+def http_server(tmp):
+    """
+    Serve `tmp.dir` over HTTP with byte range support.  Yields a `(base_url, handler_class)` tuple; set
+    `handler_class.accept_ranges = False` to emulate a server without range support.
+    """
+    handler = type('TestRangeRequestHandler', (RangeRequestHandler,), {'root': tmp.dir})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', handler
+    server.shutdown()
+    server.server_close()
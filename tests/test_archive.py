@@ -0,0 +1,113 @@
+import gzip
+import io
+import os
+import tarfile
+
+import pytest
+
+from hydra.core.exc import HydraError
+from hydra.helpers.archive import (ParallelGzipCodec, archive_files, diff_file_listing, get_codec, jumpstart_archive,
+                                   jumpstart_chain, parse_file_listing)
+
+
+def make_tar(tmp, size=512 * 1024):
+    source = os.path.join(tmp.dir, 'app.db')
+    os.makedirs(source)
+    with open(os.path.join(source, '000001.ldb'), 'wb') as ldb:
+        ldb.write(os.urandom(size))
+
+    tar_bytes = io.BytesIO()
+    with tarfile.open(fileobj=tar_bytes, mode='w') as tar:
+        tar.add(source, arcname='app.db')
+    return tar_bytes.getvalue()
+
+
+def extract(archive, data, destination):
+    with get_codec(archive).open(io.BytesIO(data)) as tar_stream, \
+            tarfile.open(fileobj=tar_stream, mode='r|') as tar:
+        for member in tar:
+            tar.extract(member, destination)
+
+
+def test_jumpstart_archive_metadata():
+    jumps_json = {'latest': 'a.tar.zst', '10': 'a.tar.zst', '5': 'b.tar.gz',
+                  'archives': {'a.tar.zst': {'codec': 'zstd'}}}
+    assert jumpstart_archive(jumps_json, 'latest') == {'file': 'a.tar.zst', 'codec': 'zstd'}
+    assert jumpstart_archive(jumps_json, '5') == {'file': 'b.tar.gz', 'codec': 'gzip'}
+
+
+def test_parallel_gzip_members(tmp):
+    tar_data = make_tar(tmp)
+    block = 100 * 1024
+    members = [gzip.compress(tar_data[i:i + block]) for i in range(0, len(tar_data), block)]
+    archive = {'file': 'a.tar.gz', 'codec': 'pgzip', 'members': [len(member) for member in members]}
+
+    destination = os.path.join(tmp.dir, 'parallel')
+    extract(archive, b''.join(members), destination)
+    assert (open(os.path.join(destination, 'app.db', '000001.ldb'), 'rb').read() ==
+            open(os.path.join(tmp.dir, 'app.db', '000001.ldb'), 'rb').read())
+
+    # Any gzip reader can still decode the concatenated members serially
+    destination = os.path.join(tmp.dir, 'serial')
+    extract({'file': 'a.tar.gz', 'codec': 'gzip'}, b''.join(members), destination)
+    assert os.path.exists(os.path.join(destination, 'app.db', '000001.ldb'))
+
+
+def test_parallel_gzip_memory_bounded():
+    # Inflated blocks held ahead of the reader stay within the byte budget on machines with many cores
+    for workers in (1, 4, 16, 64):
+        codec = ParallelGzipCodec({'codec': 'pgzip'}, workers=workers)
+        assert 1 <= codec.lookahead <= workers
+        assert codec.lookahead * codec.block_bytes <= codec.max_inflight_bytes
+
+    # Archives of a split jumpstart extracted at once divide the budget between them
+    shared = [get_codec({'codec': 'pgzip'}, shares=4) for _ in range(4)]
+    assert sum(codec.lookahead * codec.block_bytes for codec in shared) <= ParallelGzipCodec.max_inflight_bytes
+    assert all(codec.workers == max(1, (os.cpu_count() or 1) // 4) for codec in shared)
+
+
+def test_unknown_codec():
+    with pytest.raises(HydraError):
+        get_codec({'file': 'a.tar.xz', 'codec': 'xz'})
+
+
+def test_jumpstart_chain():
+    jumps_json = {
+        '100': 'base.tar.gz',
+        '200': 'delta1.tar.zst',
+        '300': 'delta2.tar.gz',
+        'latest': 'delta2.tar.gz',
+        'archives': {
+            'delta1.tar.zst': {'codec': 'zstd', 'parent': 'base.tar.gz'},
+            'delta2.tar.gz': {'codec': 'gzip', 'parent': 'delta1.tar.zst'},
+        },
+    }
+    chain = jumpstart_chain(jumps_json, 'latest')
+    assert [archive['file'] for archive in chain] == ['base.tar.gz', 'delta1.tar.zst', 'delta2.tar.gz']
+    assert chain[1]['codec'] == 'zstd'
+    assert [archive['file'] for archive in jumpstart_chain(jumps_json, '100')] == ['base.tar.gz']
+
+
+def test_diff_file_listing():
+    listing = parse_file_listing('app.db/000001.ldb 100 1.0\napp.db/MANIFEST-000002 20 1.0\n')
+    current = parse_file_listing('app.db/000001.ldb 100 1.0\napp.db/000003.ldb 50 2.0\n'
+                                 'app.db/MANIFEST-000002 40 2.0\n')
+    assert diff_file_listing(listing, current) == (['app.db/000003.ldb', 'app.db/MANIFEST-000002'], [])
+
+    current.pop('app.db/000001.ldb')
+    assert diff_file_listing(listing, current)[1] == ['app.db/000001.ldb']
+
+
+def test_archive_files():
+    jumps_json = {
+        '100': 'base.tar.gz',
+        '200': 'split.tar.gz',
+        'archives': {
+            'base.tar.gz': {'sha256': 'a'},
+            'split.tar.gz': {'parts': [{'file': 'split-app.db.tar.gz', 'sha256': 'b'}]},
+        },
+    }
+    assert archive_files(jumps_json) == {
+        'base.tar.gz': {'sha256': 'a'},
+        'split-app.db.tar.gz': {'file': 'split-app.db.tar.gz', 'sha256': 'b'},
+    }
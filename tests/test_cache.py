@@ -0,0 +1,40 @@
+import os
+
+from hydra.main import HydraTest
+
+
+def write_file(path, size):
+    with open(path, 'wb') as new_file:
+        new_file.write(os.urandom(size))
+
+
+def test_store_lookup_install(tmp):
+    source = os.path.join(tmp.dir, 'shipchain')
+    write_file(source, 1024)
+
+    with HydraTest() as app:
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        assert app.cache.lookup('channel', '1.0', 'shipchain') is None
+
+        blob = app.cache.store('channel', '1.0', 'shipchain', source)
+        assert app.cache.lookup('channel', '1.0', 'shipchain') == blob
+        assert app.cache.lookup('channel', '1.1', 'shipchain') is None
+
+        destination = os.path.join(tmp.dir, 'installed')
+        app.cache.install(blob, destination)
+        assert open(destination, 'rb').read() == open(source, 'rb').read()
+
+
+def test_lru_eviction(tmp):
+    with HydraTest() as app:
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        app.config.set('cache', 'max_size', 2500)
+
+        for version in ('1.0', '1.1', '1.2'):
+            source = os.path.join(tmp.dir, f'shipchain-{version}')
+            write_file(source, 1000)
+            app.cache.store('channel', version, 'shipchain', source)
+
+        assert app.cache.lookup('channel', '1.0', 'shipchain') is None
+        assert app.cache.lookup('channel', '1.1', 'shipchain')
+        assert app.cache.lookup('channel', '1.2', 'shipchain')
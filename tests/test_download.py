@@ -0,0 +1,182 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from hydra.core.exc import HydraError
+from hydra.helpers.download import copy_stream, parse_rate
+from hydra.main import HydraTest
+
+
+def make_payload(tmp, name, size):
+    payload = os.urandom(size)
+    with open(os.path.join(tmp.dir, name), 'wb') as payload_file:
+        payload_file.write(payload)
+    return payload
+
+
+def configure_segments(app, connections=4, piece_size=64 * 1024):
+    app.config.set('download', 'connections', connections)
+    app.config.set('download', 'piece_size', piece_size)
+    app.config.set('download', 'min_segmented_size', 0)
+
+
+def test_segmented_download(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 1024 * 1024 + 123)
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        configure_segments(app)
+        remote = app.download.probe(f'{base_url}/archive.tar.gz')
+        assert remote['total_bytes'] == len(payload)
+        assert remote['accepts_ranges'] is True
+        app.download.fetch(destination, f'{base_url}/archive.tar.gz', show_progress=False)
+
+    assert open(destination, 'rb').read() == payload
+
+
+def test_download_without_range_support(tmp, http_server):
+    base_url, handler = http_server
+    handler.accept_ranges = False
+    payload = make_payload(tmp, 'archive.tar.gz', 300 * 1024)
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        configure_segments(app)
+        assert app.download.probe(f'{base_url}/archive.tar.gz')['accepts_ranges'] is False
+        app.download.fetch(destination, f'{base_url}/archive.tar.gz', show_progress=False)
+
+    assert open(destination, 'rb').read() == payload
+
+
+def test_resume_download(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 512 * 1024)
+    destination = os.path.join(tmp.dir, 'downloaded')
+    url = f'{base_url}/archive.tar.gz'
+
+    with HydraTest() as app:
+        configure_segments(app)
+        remote = app.download.probe(url)
+
+        # Pretend the first 100KB were already written.  They are zeroed in the part file so the result
+        # shows whether they were reused rather than downloaded again.
+        resumed_bytes = 100 * 1024
+        with open(f'{destination}.part', 'wb') as part_file:
+            part_file.write(bytes(resumed_bytes))
+        with open(f'{destination}.part.json', 'w') as state_file:
+            json.dump({'url': url, 'total_bytes': len(payload), 'etag': remote['etag'],
+                       'last_modified': remote['last_modified'], 'completed': [[0, resumed_bytes]]}, state_file)
+
+        app.download.fetch(destination, url, show_progress=False)
+
+    assert open(destination, 'rb').read() == bytes(resumed_bytes) + payload[resumed_bytes:]
+    assert not os.path.exists(f'{destination}.part')
+    assert not os.path.exists(f'{destination}.part.json')
+
+
+def test_resume_verified_download_past_window(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 1024 * 1024)
+    destination = os.path.join(tmp.dir, 'downloaded')
+    url = f'{base_url}/archive.tar.gz'
+
+    with HydraTest() as app:
+        # The resumed bytes are far more than the two pieces the hash may run behind the workers
+        configure_segments(app, connections=2)
+        remote = app.download.probe(url)
+        resumed_bytes = 600 * 1024
+        with open(f'{destination}.part', 'wb') as part_file:
+            part_file.write(payload[:resumed_bytes])
+        with open(f'{destination}.part.json', 'w') as state_file:
+            json.dump({'url': url, 'total_bytes': len(payload), 'etag': remote['etag'],
+                       'last_modified': remote['last_modified'], 'completed': [[0, resumed_bytes]]}, state_file)
+
+        fetch = threading.Thread(target=app.download.fetch, args=(destination, url), daemon=True,
+                                 kwargs={'show_progress': False, 'sha256': hashlib.sha256(payload).hexdigest()})
+        fetch.start()
+        fetch.join(timeout=30)
+        assert not fetch.is_alive()
+
+    assert open(destination, 'rb').read() == payload
+
+
+def test_open_stream_keeps_copy(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 200 * 1024)
+    keep = os.path.join(tmp.dir, 'kept.tar.gz')
+
+    with HydraTest() as app:
+        with app.download.open_stream(f'{base_url}/archive.tar.gz', keep=keep, show_progress=False) as reader:
+            head = reader.read(1024)
+
+    assert head == payload[:1024]
+    assert open(keep, 'rb').read() == payload
+
+
+def test_checksum_verification(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 1024 * 1024 + 7)
+    destination = os.path.join(tmp.dir, 'downloaded')
+    url = f'{base_url}/archive.tar.gz'
+
+    with HydraTest() as app:
+        configure_segments(app)
+        app.download.fetch(destination, url, show_progress=False,
+                           sha256=hashlib.sha256(payload).hexdigest(), size=len(payload))
+        assert open(destination, 'rb').read() == payload
+
+        with pytest.raises(HydraError):
+            app.download.fetch(f'{destination}.bad', url, show_progress=False, sha256='0' * 64)
+        assert not os.path.exists(f'{destination}.bad')
+        assert not os.path.exists(f'{destination}.bad.part')
+
+
+def test_copy_stream_grows_chunks_and_counts_bytes():
+    payload = os.urandom(3 * 1024 * 1024 + 7)
+    reads = []
+
+    class Source(io.BytesIO):
+        def readinto(self, buffer):
+            reads.append(len(buffer))
+            return super().readinto(buffer)
+
+    destination = io.BytesIO()
+    progress = []
+    copied = copy_stream(Source(payload), destination, progress.append, max_chunk_size=1024 * 1024)
+
+    assert copied == len(payload)
+    assert destination.getvalue() == payload
+    assert sum(progress) == len(payload)
+    assert reads[:5] == [64 * 1024, 128 * 1024, 256 * 1024, 512 * 1024, 1024 * 1024]
+
+
+def test_parse_rate():
+    assert parse_rate('10M') == 10 * 1024 * 1024
+    assert parse_rate('512kb') == 512 * 1024
+    assert parse_rate(2048) == 2048
+    assert parse_rate(None) == 0
+    with pytest.raises(HydraError):
+        parse_rate('fast')
+
+
+def test_rate_limited_download(tmp, http_server):
+    base_url, _ = http_server
+    payload = make_payload(tmp, 'archive.tar.gz', 512 * 1024)
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        configure_segments(app)
+        app.config.set('download', 'rate_limit', '256K')
+        started = time.monotonic()
+        app.download.fetch(destination, f'{base_url}/archive.tar.gz', show_progress=False)
+        elapsed = time.monotonic() - started
+
+    assert open(destination, 'rb').read() == payload
+    # The first second of tokens is available immediately
+    assert elapsed >= 0.9
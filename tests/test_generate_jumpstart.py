@@ -0,0 +1,127 @@
+import hashlib
+import io
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from hydra.main import HydraTest
+
+moto = pytest.importorskip('moto')
+mock_aws = getattr(moto, 'mock_aws', None) or moto.mock_s3
+
+BUCKET = 'shipchain-network-dist'
+LISTING = 'app.db/000001.ldb 1024 1.0\napp.db/MANIFEST-000002 20 1.0\ngenesis.json 10 1.0\n'
+
+
+@pytest.fixture(scope="function")
+def s3_bucket(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        import boto3
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+class StubNode:
+    """Stands in for the SSH commands generate-jumpstart runs on a node; every command is recorded"""
+
+    def __init__(self, archive_data, fail_snapshot=False, fail_upload=False):
+        self.archive_data = archive_data
+        self.fail_snapshot = fail_snapshot
+        self.fail_upload = fail_upload
+        self.commands = []
+
+    def run_command(self, ip, cmd, stream=False, timeout=None):
+        self.commands.append(cmd)
+        if cmd == 'hydra -o json client status':
+            return json.dumps({'node_block_height': '100'})
+        if 'cp -al' in cmd:
+            return '' if self.fail_snapshot else 'snapshot complete\n'
+        if cmd.startswith('cd /data/testnet/.jumpstart-snapshot; find '):
+            return LISTING
+        if 'sha256sum' in cmd:
+            return f'{len(self.archive_data)}\n{hashlib.sha256(self.archive_data).hexdigest()}  archive\n'
+        return ''
+
+    def execute(self, ip, cmd, timeout=None, stdin=None, on_stdout=None):
+        self.commands.append(cmd)
+        # pgzip prints the compressed size of each member it writes
+        return {'status': 0, 'stdout': f'{len(self.archive_data)}\n', 'stderr': '', 'seconds': 0}
+
+    def log_command(self, ip, cmd, timeout=None):
+        self.commands.append(cmd)
+        return 1 if self.fail_upload and 'aws s3 cp' in cmd else 0
+
+    @contextmanager
+    def stream_command(self, ip, cmd):
+        self.commands.append(cmd)
+        yield io.BytesIO(self.archive_data)
+
+    def attach(self, app):
+        app.network.run_command = self.run_command
+        app.network.stream_command = self.stream_command
+        app.network.execute = self.execute
+        app.network.log_command = self.log_command
+
+
+def generate_jumpstart(tmp, node, *args):
+    with open(os.path.join(tmp.dir, 'networks.json'), 'w') as networks_file:
+        json.dump({'testnet': {'ips': ['10.0.0.1', '10.0.0.2']}}, networks_file)
+
+    argv = ['network', 'generate-jumpstart', '--name', 'testnet', *args]
+    with HydraTest(argv=argv) as app:
+        app.config.set('hydra', 'workdir', tmp.dir)
+        node.attach(app)
+        app.run()
+        return app.exit_code
+
+
+def test_generate_jumpstart(tmp, s3_bucket):
+    node = StubNode(os.urandom(100 * 1024))
+    assert generate_jumpstart(tmp, node) == 0
+
+    jumps_json = json.loads(s3_bucket.get_object(Bucket=BUCKET, Key='jumpstart/testnet/jumps.json')['Body'].read())
+    tarfile = jumps_json['latest']
+    assert jumps_json['100'] == tarfile and tarfile.endswith('_100_testnet.tar.gz')
+    archive = jumps_json['archives'][tarfile]
+    assert archive['codec'] == 'gzip'
+    assert archive['size'] == len(node.archive_data)
+    assert archive['sha256'] == hashlib.sha256(node.archive_data).hexdigest()
+
+    body = s3_bucket.get_object(Bucket=BUCKET, Key=f'jumpstart/testnet/{tarfile}')['Body'].read()
+    assert body == node.archive_data
+    assert json.loads(s3_bucket.get_object(Bucket=BUCKET, Key=f'jumpstart/testnet/{tarfile}.files.json')[
+        'Body'].read()) == {'app.db/000001.ldb': [1024, '1.0'], 'app.db/MANIFEST-000002': [20, '1.0'],
+                            'genesis.json': [10, '1.0']}
+
+    # The node is restarted as soon as it is snapshotted, and the snapshot is removed at the end
+    assert node.commands.index('hydra client start-service --name testnet 2>&1') < \
+        next(index for index, cmd in enumerate(node.commands) if 'tar -' in cmd)
+    assert node.commands[-1] == 'rm -rf /data/testnet/.jumpstart-snapshot'
+
+
+def test_generate_jumpstart_failure_exits_nonzero(tmp, s3_bucket):
+    assert generate_jumpstart(tmp, StubNode(b'', fail_snapshot=True)) == 1
+    assert 'Contents' not in s3_bucket.list_objects_v2(Bucket=BUCKET)
+
+
+def test_generate_jumpstart_on_disk(tmp, s3_bucket):
+    node = StubNode(os.urandom(1024))
+    assert generate_jumpstart(tmp, node, '--codec', 'pgzip') == 0
+
+    jumps_json = json.loads(s3_bucket.get_object(Bucket=BUCKET, Key='jumpstart/testnet/jumps.json')['Body'].read())
+    archive = jumps_json['archives'][jumps_json['latest']]
+    assert archive['members'] == [1024] and archive['size'] == 1024
+    assert any('aws s3 cp' in cmd for cmd in node.commands)
+
+
+def test_generate_jumpstart_upload_failure(tmp, s3_bucket):
+    node = StubNode(os.urandom(1024), fail_upload=True)
+    assert generate_jumpstart(tmp, node, '--codec', 'pgzip') == 1
+    assert 'Contents' not in s3_bucket.list_objects_v2(Bucket=BUCKET)
+    assert node.commands[-1] == 'rm -rf /data/testnet/.jumpstart-snapshot'
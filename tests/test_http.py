@@ -0,0 +1,40 @@
+import os
+
+from hydra.main import HydraTest
+
+
+def test_metadata_revalidated_and_deduplicated(tmp, http_server):
+    base_url, _ = http_server
+    with open(os.path.join(tmp.dir, 'hydra.json'), 'w') as hydra_json:
+        hydra_json.write('{"chain_id": "test"}')
+    url = f'{base_url}/hydra.json'
+
+    with HydraTest() as app:
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        assert app.http.get_metadata(url) == b'{"chain_id": "test"}'
+        assert app.http.get_metadata(url) == b'{"chain_id": "test"}'
+        assert sum(stats['requests'] for stats in app.http.stats.values()) == 1
+
+    with HydraTest() as app:
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        response_codes = []
+        original_get = app.http.get
+
+        def get(*args, **kwargs):
+            response = original_get(*args, **kwargs)
+            response_codes.append(response.status_code)
+            return response
+
+        app.http.get = get
+        assert app.http.get_metadata(url) == b'{"chain_id": "test"}'
+        assert response_codes == [304]
+
+
+def test_metadata_errors_not_cached(tmp, http_server):
+    base_url, _ = http_server
+
+    with HydraTest() as app:
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        app.http.get_metadata(f'{base_url}/missing.json')
+        app.http.get_metadata(f'{base_url}/missing.json')
+        assert sum(stats['requests'] for stats in app.http.stats.values()) == 2
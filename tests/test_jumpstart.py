@@ -0,0 +1,182 @@
+import io
+import json
+import os
+import tarfile
+import threading
+
+import pytest
+
+from hydra.core.exc import HydraError
+from hydra.main import HydraTest
+
+
+def write_tar(path, files):
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def publish(tmp, jumps_json, archives, published_at=1000000000):
+    directory = os.path.join(tmp.dir, 'jumpstart', 'testnet')
+    os.makedirs(directory, exist_ok=True)
+    for file_name, files in archives.items():
+        write_tar(os.path.join(directory, file_name), files)
+    with open(os.path.join(directory, 'jumps.json'), 'w') as jumps_file:
+        json.dump(jumps_json, jumps_file)
+    # The test server only validates with Last-Modified, which has one second resolution
+    os.utime(os.path.join(directory, 'jumps.json'), (published_at, published_at))
+
+
+def jumpstart(tmp, base_url, node_directory, block, **kwargs):
+    with HydraTest() as app:
+        app.config.set('hydra', 'channel_url', base_url)
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        app.client.jumpstart('testnet', node_directory, block, **kwargs)
+
+
+def test_incremental_jumpstart(tmp, http_server, monkeypatch):
+    base_url, _ = http_server
+    node_directory = os.path.join(tmp.dir, 'node')
+    os.makedirs(node_directory)
+    monkeypatch.chdir(node_directory)
+
+    publish(tmp, {'100': 'base.tar.gz', 'latest': 'base.tar.gz'}, {
+        'base.tar.gz': {'app.db/000001.ldb': b'one', 'app.db/000002.ldb': b'two', 'app.db/CURRENT': b'1'},
+    })
+    jumpstart(tmp, base_url, node_directory, 'latest')
+    assert sorted(os.listdir('app.db')) == ['000001.ldb', '000002.ldb', 'CURRENT']
+
+    # The node only needs the delta, the base is gone from the server
+    os.remove(os.path.join(tmp.dir, 'jumpstart', 'testnet', 'base.tar.gz'))
+    publish(tmp, {
+        '100': 'base.tar.gz',
+        '200': 'delta.tar.gz',
+        'latest': 'delta.tar.gz',
+        'archives': {'delta.tar.gz': {'parent': 'base.tar.gz'}},
+    }, {
+        'delta.tar.gz': {'app.db/000003.ldb': b'three', 'app.db/CURRENT': b'2',
+                         '.jumpstart-deleted': b'app.db/000001.ldb\n'},
+    }, published_at=1000000100)
+    with open(os.path.join(tmp.dir, 'jumpstart', 'testnet', 'delta.tar.gz.files.json'), 'w') as listing_file:
+        json.dump({'app.db/000002.ldb': [3, '1.0'], 'app.db/000003.ldb': [5, '1.0'], 'app.db/CURRENT': [1, '1.0']},
+                  listing_file)
+    # Files the node wrote since the base that aren't in the delta's snapshot are pruned
+    with open('app.db/000004.log', 'wb') as log_file:
+        log_file.write(b'log')
+    jumpstart(tmp, base_url, node_directory, 'latest')
+
+    assert sorted(os.listdir('app.db')) == ['000002.ldb', '000003.ldb', 'CURRENT']
+    assert open('app.db/CURRENT', 'rb').read() == b'2'
+    assert not os.path.exists('.jumpstart-deleted')
+    state = json.load(open('.jumpstart.json'))
+    assert state['applied'] == ['base.tar.gz', 'delta.tar.gz']
+    assert state['files'] == {'app.db/000002.ldb': 3, 'app.db/000003.ldb': 5}
+
+
+def test_split_jumpstart(tmp, http_server, monkeypatch):
+    base_url, _ = http_server
+    node_directory = os.path.join(tmp.dir, 'node')
+    os.makedirs(os.path.join(node_directory, 'chaindata', 'data', 'stale.db'))
+    monkeypatch.chdir(node_directory)
+
+    parts = {
+        'split-app.db.tar.gz': {'app.db/000001.ldb': b'app' * 1000},
+        'split-state.db.tar.gz': {'chaindata/data/state.db/000001.ldb': b'state'},
+        'split-blockstore.db.tar.gz': {'chaindata/data/blockstore.db/000001.ldb': b'blocks' * 100},
+        'split-config.tar.gz': {'genesis.json': b'{}', 'chaindata/config/genesis.json': b'{}'},
+    }
+    publish(tmp, {
+        '100': 'split.tar.gz',
+        'latest': 'split.tar.gz',
+        'archives': {'split.tar.gz': {'codec': 'gzip', 'parts': [
+            {'file': 'split-app.db.tar.gz', 'codec': 'gzip', 'paths': ['app.db']},
+            {'file': 'split-state.db.tar.gz', 'codec': 'gzip', 'paths': ['chaindata/data/state.db']},
+            {'file': 'split-blockstore.db.tar.gz', 'codec': 'gzip', 'paths': ['chaindata/data/blockstore.db']},
+            {'file': 'split-config.tar.gz', 'codec': 'gzip',
+             'paths': ['genesis.json', 'chaindata/config/genesis.json']},
+        ]}},
+    }, parts)
+    jumpstart(tmp, base_url, node_directory, 'latest')
+
+    for files in parts.values():
+        for path, data in files.items():
+            assert open(path, 'rb').read() == data
+    assert sorted(os.listdir('chaindata/data')) == ['blockstore.db', 'state.db']
+    assert not [name for name in os.listdir('.') if name.endswith('.tar.gz')]
+    assert json.load(open('.jumpstart.json'))['applied'] == ['split.tar.gz']
+
+
+def test_jumpstart_swaps_in_staged_data(tmp, http_server, monkeypatch):
+    base_url, _ = http_server
+    node_directory = os.path.join(tmp.dir, 'node')
+    os.makedirs(os.path.join(node_directory, 'app.db'))
+    monkeypatch.chdir(node_directory)
+    with open('app.db/000001.ldb', 'wb') as ldb:
+        ldb.write(b'old')
+
+    # A corrupt archive leaves the node data untouched
+    publish(tmp, {'100': 'base.tar.gz', 'latest': 'base.tar.gz'}, {})
+    with open(os.path.join(tmp.dir, 'jumpstart', 'testnet', 'base.tar.gz'), 'wb') as archive_file:
+        archive_file.write(b'not a tar')
+    with pytest.raises(HydraError):
+        jumpstart(tmp, base_url, node_directory, 'latest')
+    assert open('app.db/000001.ldb', 'rb').read() == b'old'
+    assert not os.path.exists('.jumpstart-staging')
+
+    publish(tmp, {'100': 'base.tar.gz', 'latest': 'base.tar.gz'}, {
+        'base.tar.gz': {'app.db/000002.ldb': b'new', 'genesis.json': b'{}'},
+    }, published_at=1000000100)
+    jumpstart(tmp, base_url, node_directory, 'latest')
+    for thread in threading.enumerate():
+        if thread.name == 'hydra-trash':
+            thread.join()
+
+    assert os.listdir('app.db') == ['000002.ldb']
+    assert open('genesis.json', 'rb').read() == b'{}'
+    assert not os.path.exists('.jumpstart-staging')
+    assert not os.path.exists('.jumpstart-trash')
+
+
+def test_jumpstart_components():
+    with HydraTest() as app:
+        assert app.client.jumpstart_components() is None
+        assert app.client.jumpstart_components('rpc') is None
+        assert 'receipts_db' not in app.client.jumpstart_components('validator')
+        assert 'receipts_db' in app.client.jumpstart_components('validator', 'receipts_db')
+        assert app.client.jumpstart_components(components='state.db') == {'state.db'}
+        with pytest.raises(HydraError):
+            app.client.jumpstart_components(components='nope.db')
+
+
+def test_selective_jumpstart(tmp, http_server, monkeypatch):
+    base_url, _ = http_server
+    node_directory = os.path.join(tmp.dir, 'node')
+    os.makedirs(node_directory)
+    monkeypatch.chdir(node_directory)
+
+    publish(tmp, {
+        '100': 'split.tar.gz',
+        'latest': 'split.tar.gz',
+        'archives': {'split.tar.gz': {'codec': 'gzip', 'parts': [
+            {'file': 'split-app.db.tar.gz', 'codec': 'gzip', 'paths': ['app.db']},
+            {'file': 'split-receipts_db.tar.gz', 'codec': 'gzip', 'paths': ['receipts_db']},
+            {'file': 'split-config.tar.gz', 'codec': 'gzip', 'paths': ['genesis.json']},
+        ]}},
+    }, {
+        'split-app.db.tar.gz': {'app.db/000001.ldb': b'app'},
+        'split-config.tar.gz': {'genesis.json': b'{}'},
+    })
+    # The receipts_db archive was never published, so it must not be requested
+    jumpstart(tmp, base_url, node_directory, 'latest', components={'app.db'})
+    assert os.listdir('app.db') == ['000001.ldb']
+    assert os.path.exists('genesis.json')
+    assert json.load(open('.jumpstart.json'))['components'] == ['app.db']
+
+    publish(tmp, {'200': 'base.tar.gz', 'latest': 'base.tar.gz'}, {
+        'base.tar.gz': {'app.db/000002.ldb': b'app', 'receipts_db/000001.ldb': b'receipts'},
+    }, published_at=1000000100)
+    jumpstart(tmp, base_url, node_directory, 'latest', components={'app.db'})
+    assert os.listdir('app.db') == ['000002.ldb']
+    assert not os.path.exists('receipts_db')
@@ -0,0 +1,52 @@
+import os
+
+from hydra.main import HydraTest
+
+DEAD_MIRROR = 'http://127.0.0.1:9'
+
+
+def configure_mirrors(app, tmp, *mirrors):
+    app.config.set('hydra', 'channel_url', ', '.join(mirrors))
+    app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+    app.config.set('http', 'retries', 0)
+
+
+def test_ranking_skips_unreachable_mirror(tmp, http_server):
+    base_url, _ = http_server
+    os.makedirs(os.path.join(tmp.dir, 'latest'))
+    with open(os.path.join(tmp.dir, 'latest', 'shipchain'), 'wb') as binary:
+        binary.write(os.urandom(64 * 1024))
+
+    with HydraTest() as app:
+        configure_mirrors(app, tmp, DEAD_MIRROR, base_url)
+        assert app.mirrors.urls == [DEAD_MIRROR, base_url]
+        assert app.mirrors.ranked() == [base_url, DEAD_MIRROR]
+        assert app.mirrors.url('latest/shipchain') == f'{base_url}/latest/shipchain'
+
+    # The ranking is cached
+    with HydraTest() as app:
+        configure_mirrors(app, tmp, DEAD_MIRROR, base_url)
+        app.mirrors._probe = None
+        assert app.mirrors.ranked() == [base_url, DEAD_MIRROR]
+
+
+def test_failover(tmp, http_server):
+    base_url, _ = http_server
+    payload = os.urandom(128 * 1024)
+    os.makedirs(os.path.join(tmp.dir, 'networks', 'testnet'))
+    with open(os.path.join(tmp.dir, 'networks', 'testnet', 'hydra.json'), 'w') as hydra_json:
+        hydra_json.write('{"version": "1.0"}')
+    with open(os.path.join(tmp.dir, 'payload'), 'wb') as payload_file:
+        payload_file.write(payload)
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        configure_mirrors(app, tmp, DEAD_MIRROR, base_url)
+        app.mirrors._ranked = [DEAD_MIRROR, base_url]
+        assert app.mirrors.get_metadata('networks/testnet/hydra.json') == b'{"version": "1.0"}'
+        assert app.mirrors.ranked() == [base_url, DEAD_MIRROR]
+
+        app.mirrors._ranked = [DEAD_MIRROR, base_url]
+        app.mirrors.fetch(destination, 'payload')
+
+    assert open(destination, 'rb').read() == payload
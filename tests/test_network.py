@@ -0,0 +1,209 @@
+import json
+import os
+import shlex
+import subprocess
+import time
+
+import pytest
+
+from hydra.helpers import network
+from hydra.main import HydraTest
+
+
+class FakeChannel:
+    """Runs `echo <text>`, `fail` (exit 1), `sleep` (never exits), and `sh -c` and `bash -s` commands locally"""
+
+    def __init__(self):
+        self.closed = False
+        self.stdout, self.stderr, self.status = b'', b'', None
+        self._read_fd, self._write_fd = os.pipe()
+
+    def exec_command(self, cmd):
+        if cmd.startswith('echo '):
+            self.stdout, self.status = cmd[5:].encode() + b'\n', 0
+        elif cmd == 'fail':
+            self.stderr, self.status = b'failed\n', 1
+        elif cmd.startswith('sh -c '):
+            self._run(shlex.split(cmd))
+        self._stdin = b''
+
+    def sendall(self, data):
+        self._stdin += data
+
+    def shutdown_write(self):
+        self._run(['bash', '-s'], self._stdin)
+
+    def _run(self, args, stdin=None):
+        process = subprocess.run(args, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        self.stdout, self.stderr, self.status = process.stdout, process.stderr, process.returncode
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        data, self.stderr = self.stderr[:size], self.stderr[size:]
+        return data
+
+    def exit_status_ready(self):
+        return self.status is not None
+
+    def recv_exit_status(self):
+        return self.status
+
+    def fileno(self):
+        return self._read_fd
+
+    def close(self):
+        if not self.closed:
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+        self.closed = True
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def open_session(self):
+        return FakeChannel()
+
+
+class FakeSSHClient:
+    """Records handshakes; 10.0.0.9 is unreachable"""
+    connects = []
+
+    def __init__(self):
+        self.transport = None
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, ip, **kwargs):
+        if ip == '10.0.0.9':
+            raise OSError('No route to host')
+        self.connects.append(ip)
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+@pytest.fixture(scope="function")
+def fake_ssh(monkeypatch):
+    FakeSSHClient.connects = []
+    monkeypatch.setattr(network.paramiko, 'SSHClient', FakeSSHClient)
+    yield FakeSSHClient
+
+
+def test_ssh_connections_pooled(fake_ssh):
+    with HydraTest() as app:
+        app.config.set('provision', 'aws_ec2_key_name', 'hydra')
+        assert [app.network.run_command(ip, 'echo hi') for ip in ('10.0.0.1', '10.0.0.1', '10.0.0.2')] == \
+            ['hi\n'] * 3
+        assert fake_ssh.connects == ['10.0.0.1', '10.0.0.2']
+
+        # A dropped transport is replaced on the next command
+        app.network._ssh_client('10.0.0.1').transport.active = False
+        assert app.network.run_command('10.0.0.1', 'echo up') == 'up\n'
+        assert fake_ssh.connects == ['10.0.0.1', '10.0.0.2', '10.0.0.1']
+
+        pooled = list(app.network._ssh_clients.values())
+        app.network.close()
+        assert not any(client.transport.active for client in pooled)
+
+
+def test_run_on_nodes(fake_ssh):
+    finished = []
+    with HydraTest() as app:
+        app.config.set('provision', 'aws_ec2_key_name', 'hydra')
+        results = app.network.run_on_nodes(['10.0.0.1', '10.0.0.2', '10.0.0.9'], 'echo hi', 2,
+                                           on_result=lambda ip, result: finished.append(ip))
+        assert list(results) == ['10.0.0.1', '10.0.0.2', '10.0.0.9']
+        assert sorted(finished) == sorted(results)
+        assert results['10.0.0.1']['status'] == 0 and results['10.0.0.1']['stdout'] == 'hi\n'
+        assert results['10.0.0.9']['status'] is None and 'No route to host' in results['10.0.0.9']['stderr']
+
+        assert app.network.execute('10.0.0.1', 'fail')['status'] == 1
+        timed_out = app.network.execute('10.0.0.1', 'sleep', timeout=0.2)
+        assert timed_out['status'] is None and timed_out['seconds'] >= 0.2
+
+
+def test_run_on_all_nodes(tmp, fake_ssh):
+    with open(os.path.join(tmp.dir, 'networks.json'), 'w') as networks_file:
+        json.dump({'testnet': {'ips': ['10.0.0.1', '10.0.0.2']}}, networks_file)
+
+    argv = ['-o', 'json', 'network', 'run-on-all-nodes', '--name', 'testnet', '-c', 'echo hi', '--parallel', '2']
+    with HydraTest(argv=argv) as app:
+        app.config.set('hydra', 'workdir', tmp.dir)
+        app.config.set('provision', 'aws_ec2_key_name', 'hydra')
+        app.run()
+        data, _ = app.last_rendered
+        assert {ip: result['status'] for ip, result in data.items()} == {'10.0.0.1': 0, '10.0.0.2': 0}
+        assert app.exit_code == 0
+
+
+def test_run_script(tmp, fake_ssh):
+    # A step reading stdin must not swallow the rest of the script
+    commands = ['echo one', 'echo two >&2; exit 3', 'cat > /dev/null', 'pwd']
+    with HydraTest() as app:
+        app.config.set('provision', 'aws_ec2_key_name', 'hydra')
+        result = app.network.run_script('10.0.0.1', commands, directory=tmp.dir)
+        assert [(step['status'], step['output']) for step in result['steps']] == \
+            [(0, 'one\n'), (3, 'two\n'), (0, ''), (0, f'{os.path.realpath(tmp.dir)}\n')]
+        assert result['status'] == 3
+
+        results = app.network.run_scripts({'10.0.0.1': ['true'], '10.0.0.2': ['true']}, 2,
+                                          directory=os.path.join(tmp.dir, 'missing'))
+        assert all(result['status'] is None and not result['steps'] for result in results.values())
+
+
+def test_run_command_stream(fake_ssh, monkeypatch):
+    monkeypatch.setattr(network.NetworkHelper, 'SSH_TAIL_LINES', 3)
+    monkeypatch.setattr(network.NetworkHelper, 'SSH_MAX_LINE', 10)
+    with HydraTest() as app:
+        app.config.set('provision', 'aws_ec2_key_name', 'hydra')
+        lines = app.network.run_command('10.0.0.1', 'sh -c "seq 1 5; echo oops >&2; printf %025d 0; exit 2"',
+                                        stream=True)
+        output = list(lines)
+        assert sorted(output) == sorted(['1', '2', '3', '4', '5', 'oops', '0' * 10, '0' * 10, '0' * 5])
+        assert lines.status == 2
+        assert len(lines.tail) == 3
+
+        assert app.network.log_command('10.0.0.1', 'echo done') == 0
+
+
+def test_wait_for_nodes():
+    attempts = {'10.0.0.1': 0, '10.0.0.2': 0, '10.0.0.3': 0}
+    ready = []
+
+    def check(ip):
+        attempts[ip] += 1
+        # 10.0.0.1 is ready at once, 10.0.0.2 on its third attempt and 10.0.0.3 never
+        if ip == '10.0.0.3' or (ip == '10.0.0.2' and attempts[ip] < 3):
+            raise OSError('Connection refused')
+        return {'ip': ip}
+
+    with HydraTest() as app:
+        started = time.monotonic()
+        results = app.network.wait_for_nodes(list(attempts), check, 0.5, on_ready=lambda ip, _: ready.append(ip),
+                                             base_delay=0.01, max_delay=0.05)
+        assert time.monotonic() - started < 2
+        assert results == {'10.0.0.1': {'ip': '10.0.0.1'}, '10.0.0.2': {'ip': '10.0.0.2'}}
+        assert sorted(ready) == ['10.0.0.1', '10.0.0.2'] and attempts['10.0.0.2'] == 3
+        assert attempts['10.0.0.3'] > 3
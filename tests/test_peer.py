@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+import threading
+
+import pytest
+import requests
+
+from hydra.helpers.peer import JumpstartRequestHandler, ThreadingHTTPServer, verified_archives
+from hydra.main import HydraTest
+
+PIECE_SIZE = 64 * 1024
+
+
+@pytest.fixture(scope="function")
+def peer_server():
+    """Serve `{URL path: file path}` from a peer; yields a function that starts it and returns its base URL"""
+    servers = []
+
+    def serve(files):
+        handler = type('PeerHandler', (JumpstartRequestHandler,), {'files': files})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_archive(tmp, size=10 * PIECE_SIZE + 123):
+    payload = os.urandom(size)
+    os.makedirs(os.path.join(tmp.dir, 'jumpstart'), exist_ok=True)
+    with open(os.path.join(tmp.dir, 'jumpstart', 'archive.tar.gz'), 'wb') as archive_file:
+        archive_file.write(payload)
+    hashes = [hashlib.sha256(payload[start:start + PIECE_SIZE]).hexdigest()
+              for start in range(0, len(payload), PIECE_SIZE)]
+    return payload, hashes
+
+
+def test_download_from_peer(tmp, http_server, peer_server):
+    base_url, _ = http_server
+    payload, hashes = make_archive(tmp)
+    peer_copy = os.path.join(tmp.dir, 'peer.tar.gz')
+    with open(peer_copy, 'wb') as peer_file:
+        peer_file.write(payload)
+    peer_url = peer_server({'/jumpstart/archive.tar.gz': peer_copy})
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        app.config.set('download', 'connections', 2)
+        app.download.fetch(destination, f'{base_url}/jumpstart/archive.tar.gz', show_progress=False,
+                           peers=[f'{peer_url}/jumpstart/archive.tar.gz'], piece_hashes=hashes,
+                           piece_size=PIECE_SIZE)
+
+    assert open(destination, 'rb').read() == payload
+
+
+def test_peer_ranges(tmp, peer_server):
+    payload, _ = make_archive(tmp, size=1000)
+    peer_url = peer_server({'/archive.tar.gz': os.path.join(tmp.dir, 'jumpstart', 'archive.tar.gz')})
+
+    response = requests.get(f'{peer_url}/archive.tar.gz', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206 and response.content == payload[100:200]
+    for invalid in ('bytes=100-50', 'bytes=1000-', 'bytes=-100'):
+        response = requests.get(f'{peer_url}/archive.tar.gz', headers={'Range': invalid})
+        assert response.status_code == 416 and response.headers['Content-Range'] == 'bytes */1000'
+
+
+def test_corrupt_peer_falls_back_to_origin(tmp, http_server, peer_server):
+    base_url, _ = http_server
+    payload, hashes = make_archive(tmp)
+    peer_copy = os.path.join(tmp.dir, 'peer.tar.gz')
+    with open(peer_copy, 'wb') as peer_file:
+        peer_file.write(bytes(len(payload)))
+    peer_url = peer_server({'/jumpstart/archive.tar.gz': peer_copy})
+    destination = os.path.join(tmp.dir, 'downloaded')
+
+    with HydraTest() as app:
+        app.config.set('download', 'connections', 2)
+        app.download.fetch(destination, f'{base_url}/jumpstart/archive.tar.gz', show_progress=False,
+                           sha256=hashlib.sha256(payload).hexdigest(), size=len(payload),
+                           peers=[f'{peer_url}/jumpstart/archive.tar.gz'], piece_hashes=hashes,
+                           piece_size=PIECE_SIZE)
+
+    assert open(destination, 'rb').read() == payload
+
+
+def test_verified_archives(tmp):
+    store = os.path.join(tmp.dir, 'store')
+    os.makedirs(store)
+    for file_name, content in (('good.tar.gz', b'good'), ('bad.tar.gz', b'bad'), ('unknown.tar.gz', b'?')):
+        with open(os.path.join(store, file_name), 'wb') as archive_file:
+            archive_file.write(content)
+
+    archives = {
+        'good.tar.gz': {'sha256': hashlib.sha256(b'good').hexdigest()},
+        'bad.tar.gz': {'sha256': hashlib.sha256(b'not bad').hexdigest()},
+    }
+    log = logging.getLogger('test')
+
+    assert verified_archives(store, archives, log) == {'good.tar.gz': os.path.join(store, 'good.tar.gz')}
+    assert os.path.exists(os.path.join(store, '.verified.json'))
+    # Unchanged archives are not hashed again
+    assert verified_archives(store, archives, log) == {'good.tar.gz': os.path.join(store, 'good.tar.gz')}
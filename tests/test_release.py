@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import stat
+
+import pytest
+
+from hydra.main import HydraTest
+
+bsdiff4 = pytest.importorskip('bsdiff4')
+
+
+def write_binary(path, version, padding):
+    with open(path, 'wb') as binary:
+        binary.write(f'#!/bin/sh\necho {version} >&2\nexit 0\n'.encode('utf-8') + padding)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return open(path, 'rb').read()
+
+
+def publish_release(tmp, version, binary, patches):
+    directory = os.path.join(tmp.dir, 'archive', version)
+    os.makedirs(os.path.join(directory, 'patches'))
+    with open(os.path.join(directory, 'shipchain'), 'wb') as binary_file:
+        binary_file.write(binary)
+
+    manifest = {
+        'version': version,
+        'checksums': {'./shipchain': {'size': len(binary), 'sha256': hashlib.sha256(binary).hexdigest()}},
+        'patches': {'./shipchain': {}},
+    }
+    for from_version, (from_binary, patch) in patches.items():
+        patch_file = f'shipchain-{from_version}.bsdiff'
+        with open(os.path.join(directory, 'patches', patch_file), 'wb') as patch_out:
+            patch_out.write(patch)
+        manifest['patches']['./shipchain'][from_version] = {
+            'file': f'./patches/{patch_file}',
+            'from_sha256': hashlib.sha256(from_binary).hexdigest(),
+            'size': len(patch),
+            'sha256': hashlib.sha256(patch).hexdigest(),
+        }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def test_upgrade_with_patch(tmp, http_server):
+    base_url, _ = http_server
+    padding = os.urandom(256 * 1024)
+    installed = os.path.join(tmp.dir, 'shipchain')
+    old_binary = write_binary(installed, '1.0', padding)
+    new_binary = write_binary(os.path.join(tmp.dir, 'new'), '1.1', padding + b'patched')
+    publish_release(tmp, '1.1', new_binary, {'1.0': (old_binary, bsdiff4.diff(old_binary, new_binary))})
+    os.remove(os.path.join(tmp.dir, 'archive', '1.1', 'shipchain'))
+
+    # A leftover from an interrupted upgrade, hardlinked to a cached blob that must not be overwritten
+    destination = os.path.join(tmp.dir, 'shipchain-temp')
+    blob = os.path.join(tmp.dir, 'blob')
+    with open(blob, 'wb') as blob_file:
+        blob_file.write(b'cached')
+    os.link(blob, destination)
+
+    with HydraTest() as app:
+        app.config.set('hydra', 'channel_url', base_url)
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        app.utils.download_release_file(destination, 'shipchain', '1.1', installed=installed)
+
+    assert open(destination, 'rb').read() == new_binary
+    assert open(blob, 'rb').read() == b'cached'
+    assert not os.path.exists(f'{destination}.bsdiff')
+    assert not os.path.exists(f'{destination}.patched')
+
+
+def test_upgrade_without_matching_patch(tmp, http_server):
+    base_url, _ = http_server
+    padding = os.urandom(1024)
+    installed = os.path.join(tmp.dir, 'shipchain')
+    write_binary(installed, '0.9', padding)
+    new_binary = write_binary(os.path.join(tmp.dir, 'new'), '1.1', padding)
+    publish_release(tmp, '1.1', new_binary, {})
+
+    destination = os.path.join(tmp.dir, 'shipchain-temp')
+    with HydraTest() as app:
+        app.config.set('hydra', 'channel_url', base_url)
+        app.config.set('cache', 'path', os.path.join(tmp.dir, 'cache'))
+        app.utils.download_release_file(destination, 'shipchain', '1.1', installed=installed)
+
+    assert open(destination, 'rb').read() == new_binary
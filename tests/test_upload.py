@@ -0,0 +1,86 @@
+import hashlib
+import io
+import threading
+import time
+
+import pytest
+
+from hydra.core.exc import HydraError
+from hydra.helpers.upload import StreamDigest, multipart_upload
+from hydra.main import HydraTest
+
+moto = pytest.importorskip('moto')
+mock_aws = getattr(moto, 'mock_aws', None) or moto.mock_s3
+
+PART_SIZE = 5 * 1024 * 1024  # the smallest part S3 accepts
+
+
+@pytest.fixture(scope="function")
+def s3_bucket(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        import boto3
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='shipchain-network-dist')
+        yield client
+
+
+class FailingSource(io.BytesIO):
+    """Fails at the end of the stream, like the output of a remote command that exited with an error"""
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data:
+            raise HydraError('command failed')
+        return data
+
+
+def test_upload_stream(s3_bucket):
+    payload = bytes(range(256)) * (PART_SIZE * 2 // 256) + b'tail'
+    digest = StreamDigest(1024 * 1024)
+
+    with HydraTest() as app:
+        app.config.set('release', 'upload_part_size', PART_SIZE)
+        app.config.set('release', 'upload_workers', 2)
+        size = app.release.upload_stream('jumpstart/testnet/archive.tar.gz', io.BytesIO(payload), digest=digest)
+
+    body = s3_bucket.get_object(Bucket='shipchain-network-dist', Key='jumpstart/testnet/archive.tar.gz')['Body']
+    assert body.read() == payload
+    assert size == digest.size == len(payload)
+    assert digest.hexdigest() == hashlib.sha256(payload).hexdigest()
+    assert digest.piece_hashes == [hashlib.sha256(payload[start:start + 1024 * 1024]).hexdigest()
+                                   for start in range(0, len(payload), 1024 * 1024)]
+
+
+def test_failed_stream_aborts_upload(s3_bucket):
+    with pytest.raises(HydraError):
+        multipart_upload(s3_bucket, 'shipchain-network-dist', 'archive.tar.gz',
+                         FailingSource(b'x' * (PART_SIZE + 1)), PART_SIZE, 2)
+
+    assert 'Contents' not in s3_bucket.list_objects_v2(Bucket='shipchain-network-dist')
+    assert 'Uploads' not in s3_bucket.list_multipart_uploads(Bucket='shipchain-network-dist')
+
+
+def test_upload_bounds_parts_in_flight():
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    class SlowClient:
+        def create_multipart_upload(self, **kwargs):
+            return {'UploadId': 'upload'}
+
+        def upload_part(self, PartNumber, **kwargs):  # pylint: disable=invalid-name
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return {'ETag': str(PartNumber)}
+
+        def complete_multipart_upload(self, MultipartUpload, **kwargs):  # pylint: disable=invalid-name
+            assert [part['PartNumber'] for part in MultipartUpload['Parts']] == list(range(1, 21))
+
+    assert multipart_upload(SlowClient(), 'bucket', 'key', io.BytesIO(b'x' * 20 * 1024), 1024, 3) == 20 * 1024
+    assert peak[0] <= 3